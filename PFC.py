@@ -1,12 +1,53 @@
 from __future__ import annotations
 
+import abc
+import argparse
+import asyncio
+import csv
+import itertools
 import json
 import math
 import os
+import re
+import sqlite3
 import sys
-from dataclasses import dataclass, asdict, field
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict, astuple, field, fields, replace
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from functools import lru_cache, partial
+from operator import attrgetter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:  # optional: only the vectorized batch APIs need NumPy
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+try:  # optional fast JSON backends for profile (de)serialization
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+try:
+    import msgspec
+except ImportError:  # pragma: no cover
+    msgspec = None
+
+try:  # TOML tax rule packs (stdlib from Python 3.11)
+    import tomllib
+except ImportError:  # pragma: no cover
+    tomllib = None
+
+try:  # advisory file locks are POSIX-only; elsewhere saves are atomic but unlocked
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
 
 APP_SAVE = os.path.join(os.path.expanduser("~"), ".pf_chatbot_profile.json")
 
@@ -14,34 +55,121 @@ APP_SAVE = os.path.join(os.path.expanduser("~"), ".pf_chatbot_profile.json")
 
 def currency(n: float) -> str:
     """Format number as Indian currency with lakh/crore separators."""
-    # Simple formatter (not locale-perfect but readable)
-    neg = n < 0
-    n = abs(n)
-    s = f"{n:,.2f}"
-    # Convert to Indian grouping (##,##,###)
-    parts = s.split('.')
-    whole = parts[0].replace(',', '')
-    if len(whole) > 3:
-        head = whole[:-3]
-        tail = whole[-3:]
-        # insert commas every 2 digits in head
-        head_groups = []
-        while head:
-            head_groups.insert(0, head[-2:])
-            head = head[:-2]
-        whole = ','.join(head_groups + [tail])
-    else:
-        whole = whole
-    res = whole + '.' + parts[1]
-    return ("-₹" if neg else "₹") + res
+    sign = "-₹" if n < 0 else "₹"
+    s = f"{abs(n):.2f}"
+    w = len(s) - 3  # digits before the decimal point
+    # Indian grouping (##,##,###): 3 digits at the end, pairs before that.
+    # Slice directly for amounts below 1 crore, which is nearly all of them.
+    if w <= 3:
+        if w < 1:
+            raise ValueError(f"cannot format {n!r} as currency")  # inf / nan
+        return sign + s
+    if w <= 5:
+        return sign + s[:w - 3] + "," + s[w - 3:]
+    if w <= 7:
+        return sign + s[:w - 5] + "," + s[w - 5:w - 3] + "," + s[w - 3:]
+    k = (w - 3) % 2 or 2
+    return sign + ",".join([s[:k]] + [s[i:i + 2] for i in range(k, w - 3, 2)]) + "," + s[w - 3:]
+
+
+_currency_cached = lru_cache(maxsize=65536)(currency)
+
+
+def currency_many(amounts, cache: bool = False) -> List[str]:
+    """
+    currency() over an iterable or NumPy array in one pass. With `cache`, repeated
+    amounts (e.g. recurring EMIs in statement tables) are formatted once.
+    """
+    if hasattr(amounts, "tolist"):
+        amounts = amounts.tolist()  # plain floats are much faster to format than NumPy scalars
+    return list(map(_currency_cached if cache else currency, amounts))
+
+
+# Short-form units, ascending. A mantissa that rounds up to the next unit is
+# promoted ("₹99.999 L" -> "₹1 Cr").
+COMPACT_UNITS = ((1.0, ""), (1e3, " K"), (1e5, " L"), (1e7, " Cr"))
+_COMPACT_BOUNDS = [u for u, _ in COMPACT_UNITS[1:]]
+_COMPACT_ROUNDING = {
+    "half_even": round,
+    "half_up": lambda x: math.floor(x + 0.5),
+    "down": math.floor,  # applied to magnitudes, so these truncate toward zero
+    "up": math.ceil,
+}
+
+
+def _check_rounding(rounding: str) -> None:
+    if rounding not in _COMPACT_ROUNDING:
+        raise ValueError(f"unknown rounding {rounding!r}; expected one of: {', '.join(_COMPACT_ROUNDING)}")
+
+
+def _group_indian(digits: str) -> str:
+    """'123456789' -> '12,34,56,789': the lakh/crore grouping of currency()."""
+    if len(digits) <= 3:
+        return digits
+    k = (len(digits) - 3) % 2 or 2
+    return ",".join([digits[:k]] + [digits[i:i + 2] for i in range(k, len(digits) - 3, 2)]) + "," + digits[-3:]
+
+
+def _compact_text(neg: bool, q: int, unit: int, digits: int) -> str:
+    whole, frac = divmod(q, 10 ** digits)
+    frac_s = f"{frac:0{digits}d}".rstrip("0") if digits else ""
+    return ("-₹" if neg else "₹") + _group_indian(str(whole)) + ("." + frac_s if frac_s else "") + COMPACT_UNITS[unit][1]
+
+
+def currency_compact(n: float, digits: int = 2, rounding: str = "half_even") -> str:
+    """
+    Short rupee form such as "₹1.25 Cr", "₹50 L" or "₹12.5 K", with at most
+    `digits` decimals. `rounding` is one of half_even, half_up, down, up; pick
+    one policy per report so rounded figures add up consistently.
+    """
+    _check_rounding(rounding)
+    rnd = _COMPACT_ROUNDING[rounding]
+    a = abs(n)
+    scale = 10 ** digits
+    unit = bisect_right(_COMPACT_BOUNDS, a)
+    q = int(rnd(round(a / COMPACT_UNITS[unit][0] * scale, 6)))  # round(.., 6) drops binary noise
+    if unit + 1 < len(COMPACT_UNITS) and q >= COMPACT_UNITS[unit + 1][0] / COMPACT_UNITS[unit][0] * scale:
+        unit += 1
+        q = int(rnd(round(a / COMPACT_UNITS[unit][0] * scale, 6)))
+    return _compact_text(n < 0 and q > 0, q, unit, digits)
+
+
+def currency_compact_many(amounts, digits: int = 2, rounding: str = "half_even") -> List[str]:
+    """
+    currency_compact over a batch. With NumPy, unit selection, scaling and
+    rounding run as array operations; only the final string assembly is per item.
+    """
+    _check_rounding(rounding)
+    if np is None:
+        return [currency_compact(a, digits, rounding) for a in amounts]
+    values = np.asarray(amounts, dtype=float)
+    a = np.abs(values)
+    scale = 10 ** digits
+    units = np.array([u for u, _ in COMPACT_UNITS])
+    rnd = {"half_even": np.rint, "half_up": lambda x: np.floor(x + 0.5), "down": np.floor, "up": np.ceil}[rounding]
+    unit = np.searchsorted(units[1:], a, side="right")
+    q = rnd(np.round(a / units[unit] * scale, 6))
+    nxt = np.minimum(unit + 1, len(units) - 1)
+    promote = (unit + 1 < len(units)) & (q >= units[nxt] / units[unit] * scale)
+    unit = np.where(promote, nxt, unit)
+    q = np.where(promote, rnd(np.round(a / units[unit] * scale, 6)), q)
+    neg = (values < 0) & (q > 0)
+    return [_compact_text(ng, int(qq), u, digits)
+            for ng, qq, u in zip(neg.ravel().tolist(), q.ravel().tolist(), unit.ravel().tolist())]
 
 
 def clamp(x: float, lo: float, hi: float) -> float:
     return max(lo, min(hi, x))
 
+
+def _require_numpy(feature: str):
+    if np is None:
+        raise ImportError(f"{feature} requires NumPy (pip install numpy)")
+    return np
+
 # ----------------------------- Persistence -----------------------------
 
-@dataclass
+@dataclass(slots=True)
 class UserProfile:
     name: str = "Friend"
     age: Optional[int] = None
@@ -60,34 +188,492 @@ class UserProfile:
         return max(0.0, self.monthly_income - self.monthly_expenses)
 
 
-def load_profile(path: str = APP_SAVE) -> UserProfile:
-    if os.path.exists(path):
+def _field_kind(f) -> Tuple[str, bool]:
+    t = str(f.type)
+    return ("int" if "int" in t else "float" if "float" in t else "str"), t.startswith("Optional")
+
+
+# UserProfile field -> (base type, accepts None), derived from the annotations
+PROFILE_FIELDS: Dict[str, Tuple[str, bool]] = {f.name: _field_kind(f) for f in fields(UserProfile)}
+_KIND_TYPES = {"int": int, "float": (int, float), "str": str}
+
+
+class ProfileTable:
+    """
+    Struct-of-arrays view of many UserProfiles for batch jobs: numeric fields
+    are NumPy columns (NaN marks None), text fields plain lists. Per-user
+    metrics are computed for the whole table at once.
+    """
+    _KINDS = {name: kind for name, (kind, _) in PROFILE_FIELDS.items()}
+
+    def __init__(self, columns: Dict[str, object]):
+        _require_numpy("ProfileTable")
+        self.columns = columns
+
+    @classmethod
+    def from_dicts(cls, rows: Iterable[dict]) -> "ProfileTable":
+        names = list(cls._KINDS)
+        raw: Dict[str, list] = {name: [] for name in names}
+        appenders = [(name, raw[name].append) for name in names]
+        for row in rows:
+            for name, append in appenders:
+                append(row[name])
+        columns: Dict[str, object] = {}
+        for name, kind in cls._KINDS.items():
+            columns[name] = raw[name] if kind == "str" else np.array(raw[name], dtype=float)
+        return cls(columns)
+
+    @classmethod
+    def from_profiles(cls, profiles: Iterable[UserProfile]) -> "ProfileTable":
+        return cls.from_dicts(map(profile_to_dict, profiles))
+
+    def __len__(self) -> int:
+        return len(self.columns["name"])
+
+    def savings_capacity(self) -> "np.ndarray":
+        """UserProfile.savings_capacity for every row (NaN where income or expenses is unknown)."""
+        return np.maximum(0.0, self.columns["monthly_income"] - self.columns["monthly_expenses"])
+
+    def emergency_fund(self) -> "np.ndarray":
+        """emergency_fund(monthly_expenses, emergency_months) for every row."""
+        return self.columns["monthly_expenses"] * self.columns["emergency_months"]
+
+    def iter_dicts(self) -> Iterator[dict]:
+        """Rows as dicts shaped exactly like asdict(UserProfile)."""
+        cols = []
+        for name, kind in self._KINDS.items():
+            col = self.columns[name]
+            if kind != "str":
+                col = [None if v != v else (int(v) if kind == "int" else v) for v in col.tolist()]
+            cols.append(col)
+        names = list(self._KINDS)
+        for values in zip(*cols):
+            yield dict(zip(names, values))
+
+    def to_profiles(self) -> List[UserProfile]:
+        return [UserProfile(**row) for row in self.iter_dicts()]
+
+
+# ------------------- Serialization -------------------
+
+_profile_values = attrgetter(*PROFILE_FIELDS)
+
+
+def profile_to_dict(profile: UserProfile) -> dict:
+    """asdict(profile) without dataclasses' recursive deep copy (all fields are scalars)."""
+    return dict(zip(PROFILE_FIELDS, _profile_values(profile)))
+
+
+def profile_from_dict(data: dict) -> UserProfile:
+    """UserProfile(**data) with a cheap schema check: unknown or mistyped fields raise ValueError."""
+    if not isinstance(data, dict):
+        raise ValueError("profile must be a JSON object")
+    unknown = data.keys() - PROFILE_FIELDS.keys()
+    if unknown:
+        raise ValueError(f"unknown profile fields: {', '.join(sorted(unknown))}")
+    for name, value in data.items():
+        kind, optional = PROFILE_FIELDS[name]
+        if value is None:
+            if not optional:
+                raise ValueError(f"profile field {name!r} may not be null")
+        elif isinstance(value, bool) or not isinstance(value, _KIND_TYPES[kind]):
+            raise ValueError(f"profile field {name!r} must be {kind}, got {type(value).__name__}")
+        elif kind == "float" and type(value) is int:
+            data = {**data, name: float(value)}
+    return UserProfile(**data)
+
+
+class ProfileSerializer:
+    """
+    JSON (de)serialization of profiles with the fastest available backend:
+    orjson, then msgspec, then the stdlib. `compact` drops indentation. NDJSON
+    helpers stream one profile per line in constant memory.
+    """
+    BACKENDS = ("orjson", "msgspec", "json")
+
+    def __init__(self, backend: Optional[str] = None, compact: bool = True):
+        if backend is None:
+            backend = "orjson" if orjson is not None else ("msgspec" if msgspec is not None else "json")
+        if backend not in self.BACKENDS:
+            raise ValueError(f"unknown serializer backend: {backend!r}")
+        if (backend == "orjson" and orjson is None) or (backend == "msgspec" and msgspec is None):
+            raise ImportError(f"serializer backend {backend!r} is not installed")
+        self.backend = backend
+        self.compact = compact
+
+    def _encode(self, obj, compact: bool) -> bytes:
+        if self.backend == "orjson":
+            return orjson.dumps(obj) if compact else orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+        if self.backend == "msgspec":
+            raw = msgspec.json.encode(obj)
+            return raw if compact else msgspec.json.format(raw, indent=2)
+        if compact:
+            return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return json.dumps(obj, indent=2).encode("utf-8")
+
+    def _decode(self, raw):
+        if self.backend == "orjson":
+            return orjson.loads(raw)
+        if self.backend == "msgspec":
+            return msgspec.json.decode(raw)
+        return json.loads(raw)
+
+    def dumps(self, profile: UserProfile) -> bytes:
+        return self._encode(profile_to_dict(profile), self.compact)
+
+    def loads(self, raw) -> UserProfile:
+        return profile_from_dict(self._decode(raw))
+
+    def dump_ndjson(self, profiles: Iterable[UserProfile], fp) -> int:
+        """Write one compact profile per line to a binary file (or path); returns the count."""
+        if isinstance(fp, str):
+            with open(fp, 'wb') as f:
+                return self.dump_ndjson(profiles, f)
+        n = 0
+        for profile in profiles:
+            fp.write(self._encode(profile_to_dict(profile), True) + b"\n")
+            n += 1
+        return n
+
+    def iter_ndjson(self, fp) -> Iterator[UserProfile]:
+        """Read profiles back line by line from a binary file (or path)."""
+        if isinstance(fp, str):
+            with open(fp, 'rb') as f:
+                yield from self.iter_ndjson(f)
+            return
+        for line in fp:
+            if line.strip():
+                yield self.loads(line)
+
+
+def write_atomic(path: str, data) -> None:
+    """Write str/bytes via a temp file in the same directory, fsync, then rename over `path`."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".pf-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data.encode('utf-8') if isinstance(data, str) else data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            return UserProfile(**data)
-        except Exception:
+            os.unlink(tmp)
+        except OSError:
             pass
-    return UserProfile()
+        raise
+    try:  # persist the rename itself (POSIX; directories cannot be opened on Windows)
+        dfd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dfd)
+        finally:
+            os.close(dfd)
+    except OSError:
+        pass
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive advisory lock on `path`.lock (no-op where fcntl is unavailable)."""
+    if fcntl is None:
+        yield
+        return
+    with open(path + ".lock", 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ProfileFile:
+    """
+    One profile JSON file. Saves are atomic and serialized across processes
+    with an advisory lock, and skipped when nothing changed since the last
+    load or save through this object. If JsonProfileStore has turned the file
+    into a multi-user map, this reads and writes its DEFAULT_USER_ID entry and
+    leaves the other users alone. A file that exists but fails to load is
+    never overwritten.
+    """
+    def __init__(self, path: str = APP_SAVE, serializer: Optional[ProfileSerializer] = None):
+        self.path = path
+        self.serializer = serializer or ProfileSerializer(compact=False)  # hand-editable by default
+        self._saved: Optional[dict] = None  # state known to be on disk
+        self._unreadable = False
+
+    def _read(self) -> Optional[dict]:
+        """Decoded file contents, or None if there is no file."""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'rb') as f:
+            return self.serializer._decode(f.read())
+
+    def load(self) -> UserProfile:
+        self._unreadable = False
+        try:
+            data = self._read()
+            if data is not None:
+                if isinstance(data.get("profiles"), dict):
+                    data = data["profiles"].get(DEFAULT_USER_ID)
+                if data is not None:
+                    profile = profile_from_dict(data)
+                    self._saved = profile_to_dict(profile)
+                    return profile
+        except Exception:
+            self._unreadable = True
+        return UserProfile()
+
+    def is_dirty(self, profile: UserProfile) -> bool:
+        return profile_to_dict(profile) != self._saved
+
+    def save(self, profile: UserProfile, force: bool = False) -> bool:
+        """Write `profile` if it changed (or `force`); returns whether it was written."""
+        if self._unreadable:
+            raise ValueError(f"{self.path} could not be loaded; not overwriting it")
+        data = profile_to_dict(profile)
+        if not force and data == self._saved:
+            return False
+        with file_lock(self.path):
+            current = self._read()
+            if current is not None and isinstance(current.get("profiles"), dict):
+                current["profiles"][DEFAULT_USER_ID] = data
+                payload = self.serializer._encode(current, self.serializer.compact)
+            else:
+                payload = self.serializer.dumps(profile)
+            write_atomic(self.path, payload)
+        self._saved = data
+        return True
+
+
+_PROFILE_FILES: Dict[str, ProfileFile] = {}
+
+
+def _profile_file(path: str) -> ProfileFile:
+    key = os.path.abspath(path)
+    if key not in _PROFILE_FILES:
+        _PROFILE_FILES[key] = ProfileFile(path)
+    return _PROFILE_FILES[key]
+
+
+def load_profile(path: str = APP_SAVE) -> UserProfile:
+    return _profile_file(path).load()
 
 
 def save_profile(profile: UserProfile, path: str = APP_SAVE) -> None:
     try:
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(asdict(profile), f, indent=2)
+        _profile_file(path).save(profile)
     except Exception as e:
         print(f"[warn] Could not save profile: {e}")
 
+# ------------------- Multi-user profile stores -------------------
+
+DEFAULT_USER_ID = "default"
+
+
+class ProfileStore(abc.ABC):
+    """
+    Profiles keyed by user id. Backends implement get_many, put_many, delete
+    and user_ids; the single-item helpers are built on the bulk calls.
+    """
+    def get(self, user_id: str) -> Optional[UserProfile]:
+        return self.get_many([user_id]).get(user_id)
+
+    def put(self, user_id: str, profile: UserProfile) -> None:
+        self.put_many([(user_id, profile)])
+
+    @abc.abstractmethod
+    def get_many(self, user_ids: Iterable[str]) -> Dict[str, UserProfile]:
+        """Profiles for the ids that exist."""
+
+    @abc.abstractmethod
+    def put_many(self, items: Iterable[Tuple[str, UserProfile]]) -> int:
+        """Insert or replace (user_id, profile) pairs; returns how many were written."""
+
+    @abc.abstractmethod
+    def delete(self, user_id: str) -> bool:
+        """Remove one profile; returns whether it existed."""
+
+    @abc.abstractmethod
+    def user_ids(self) -> List[str]:
+        """Every stored user id."""
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JsonProfileStore(ProfileStore):
+    """
+    The JSON profile file as a store. A file holding a single profile (the
+    format save_profile writes) is user DEFAULT_USER_ID; once other users are
+    added it becomes {"profiles": {user_id: profile}}. Every write rewrites the
+    whole file atomically, so this suits a handful of users.
+    """
+    def __init__(self, path: str = APP_SAVE):
+        self.path = path
+
+    def _read(self) -> Dict[str, dict]:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data.get("profiles"), dict):
+            return data["profiles"]
+        return {DEFAULT_USER_ID: data}
+
+    def _write(self, profiles: Dict[str, dict]) -> None:
+        data = profiles[DEFAULT_USER_ID] if set(profiles) == {DEFAULT_USER_ID} else {"profiles": profiles}
+        write_atomic(self.path, json.dumps(data, indent=2))
+
+    def get_many(self, user_ids: Iterable[str]) -> Dict[str, UserProfile]:
+        profiles = self._read()
+        return {uid: profile_from_dict(profiles[uid]) for uid in user_ids if uid in profiles}
+
+    def put_many(self, items: Iterable[Tuple[str, UserProfile]]) -> int:
+        with file_lock(self.path):
+            profiles = self._read()
+            n = 0
+            for uid, profile in items:
+                profiles[uid] = profile_to_dict(profile)
+                n += 1
+            if n:
+                self._write(profiles)
+        return n
+
+    def delete(self, user_id: str) -> bool:
+        with file_lock(self.path):
+            profiles = self._read()
+            if profiles.pop(user_id, None) is None:
+                return False
+            if profiles:
+                self._write(profiles)
+            else:
+                os.remove(self.path)
+        return True
+
+    def user_ids(self) -> List[str]:
+        return list(self._read())
+
+
+class SQLiteProfileStore(ProfileStore):
+    """
+    Many profiles in one SQLite database: WAL journal, one pooled connection
+    per thread, a column per UserProfile field and user_id as the (indexed)
+    primary key. Bulk calls run in a single transaction.
+    """
+    COLUMNS = tuple(f.name for f in fields(UserProfile))
+    _MAX_PARAMS = 500  # ids per IN (...) query, under SQLite's variable limit
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._conns: List[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+        cols = ", ".join(f"{c} {self._affinity(c)}" for c in self.COLUMNS)
+        self._select = f"SELECT user_id, {', '.join(self.COLUMNS)} FROM profiles WHERE user_id IN "
+        self._upsert = (f"INSERT OR REPLACE INTO profiles (user_id, {', '.join(self.COLUMNS)}) "
+                        f"VALUES ({', '.join('?' * (len(self.COLUMNS) + 1))})")
+        with self._conn() as conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS profiles (user_id TEXT PRIMARY KEY, {cols}) WITHOUT ROWID")
+
+    @staticmethod
+    def _affinity(column: str) -> str:
+        return {"int": "INTEGER", "float": "REAL", "str": "TEXT"}[PROFILE_FIELDS[column][0]]
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # sqlite3 keeps a per-connection cache of prepared statements for the fixed SQL above
+            conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def get_many(self, user_ids: Iterable[str]) -> Dict[str, UserProfile]:
+        conn = self._conn()
+        ids = list(dict.fromkeys(user_ids))
+        out: Dict[str, UserProfile] = {}
+        for i in range(0, len(ids), self._MAX_PARAMS):
+            batch = ids[i:i + self._MAX_PARAMS]
+            sql = self._select + "(" + ",".join("?" * len(batch)) + ")"
+            for row in conn.execute(sql, batch):
+                out[row[0]] = UserProfile(*row[1:])
+        return out
+
+    def put_many(self, items: Iterable[Tuple[str, UserProfile]]) -> int:
+        conn = self._conn()
+        rows = [(uid,) + astuple(profile) for uid, profile in items]
+        with conn:
+            conn.executemany(self._upsert, rows)
+        return len(rows)
+
+    def delete(self, user_id: str) -> bool:
+        with self._conn() as conn:
+            return conn.execute("DELETE FROM profiles WHERE user_id = ?", (user_id,)).rowcount > 0
+
+    def user_ids(self) -> List[str]:
+        return [r[0] for r in self._conn().execute("SELECT user_id FROM profiles ORDER BY user_id")]
+
+    def close(self) -> None:
+        with self._conns_lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns.clear()
+        self._local = threading.local()
+
 # ----------------------------- Tax Engine (India) -----------------------------
 
+# Bumped by every in-place edit of a TaxConfig, its slab lists or a TaxSlab, so
+# calculators can notice edits with one integer compare per call.
+_tax_edits = 0
+
+
+def _note_tax_edit() -> None:
+    global _tax_edits
+    _tax_edits += 1
+
+
+class _SlabList(list):
+    """List of TaxSlab that records in-place edits."""
+
+
+def _recording(name: str):
+    method = getattr(list, name)
+
+    def edit(self, *args, **kwargs):
+        _note_tax_edit()
+        return method(self, *args, **kwargs)
+    edit.__name__ = name
+    return edit
+
+
+for _name in ("__setitem__", "__delitem__", "__iadd__", "__imul__", "append", "extend", "insert",
+              "pop", "remove", "clear", "sort", "reverse"):
+    setattr(_SlabList, _name, _recording(_name))
+
+
 @dataclass
 class TaxSlab:
     up_to: Optional[float]  # upper bound for slab (None means no upper bound)
     rate: float             # e.g., 0.05 for 5%
 
+    def __setattr__(self, name, value):
+        _note_tax_edit()
+        object.__setattr__(self, name, value)
+
 @dataclass
 class TaxConfig:
-    # FY 2024-25 (Assessment Year 2025-26) baseline; update as needed
+    # FY 2023-24 rules (also FY 2024-25 until the July 2024 budget); other years
+    # are rule packs in tax_rules/, see TAX_RULES
     # Rebate u/s 87A thresholds
     rebate_threshold_new: float = 700000.0
     rebate_threshold_old: float = 500000.0
@@ -100,6 +686,12 @@ class TaxConfig:
     max_80C_old: float = 150000.0  # PPF/EPF/ELSS/Principal etc. (Old only)
     max_80D_old: float = 25000.0   # Health insurance premium (Old only; simpl.)
 
+    # Rebate u/s 87A marginal relief: tax just above the threshold is capped at
+    # the income above it (new regime since FY 2023-24; the old regime keeps the cliff)
+    rebate_relief_new: bool = True
+    rebate_relief_old: bool = False
+
+    # Health & education cess, on tax plus surcharge
     cess_rate: float = 0.04
 
     # New regime slabs
@@ -120,23 +712,508 @@ class TaxConfig:
         TaxSlab(None, 0.30),
     ])
 
+    # Surcharge on tax by taxable income (same TaxSlab shape: rate up to `up_to`),
+    # with marginal relief at each threshold; the new regime tops out at 25%
+    surcharge_new: List[TaxSlab] = field(default_factory=lambda: [
+        TaxSlab(5000000, 0.00),
+        TaxSlab(10000000, 0.10),
+        TaxSlab(20000000, 0.15),
+        TaxSlab(None, 0.25),
+    ])
+    surcharge_old: List[TaxSlab] = field(default_factory=lambda: [
+        TaxSlab(5000000, 0.00),
+        TaxSlab(10000000, 0.10),
+        TaxSlab(20000000, 0.15),
+        TaxSlab(50000000, 0.25),
+        TaxSlab(None, 0.37),
+    ])
+
+    def __setattr__(self, name, value):
+        _note_tax_edit()
+        object.__setattr__(self, name, _SlabList(value) if isinstance(value, list) else value)
+
+    def fingerprint(self) -> tuple:
+        """Hashable snapshot of every setting (slabs included), for cache keys."""
+        return tuple(
+            tuple((s.up_to, s.rate) for s in v) if isinstance(v, list) else v
+            for v in vars(self).values()
+        )
+
+
+TaxCacheInfo = namedtuple("TaxCacheInfo", "hits misses evictions maxsize currsize")
+
+
+@dataclass
+class RegimeInterval:
+    lo: float
+    hi: float
+    better: str  # "new", "old" or "either" (equal tax throughout)
+
+
+@dataclass(frozen=True)
+class CompiledSlabs:
+    """
+    Slab list flattened for lookup: bracket lower bounds, their rates and the
+    cumulative tax due at each lower bound. Tax for any amount is then a binary
+    search plus one multiply.
+    """
+    lowers: Tuple[float, ...]
+    rates: Tuple[float, ...]
+    base: Tuple[float, ...]
+    arrays: Optional[tuple] = field(default=None, compare=False, repr=False)  # NumPy mirrors for tax_many
+
+    @classmethod
+    def compile(cls, slabs: List[TaxSlab]) -> "CompiledSlabs":
+        lowers, rates, base = [0.0], [], [0.0]
+        for i, slab in enumerate(slabs):
+            rates.append(slab.rate)
+            if slab.up_to is None:
+                if i != len(slabs) - 1:
+                    raise ValueError("only the last tax slab may be open-ended")
+                break
+            if slab.up_to < lowers[-1]:
+                raise ValueError("tax slabs must be sorted by upper bound")
+            # accumulate in slab order so results match a slab-by-slab walk exactly
+            base.append(base[-1] + (slab.up_to - lowers[-1]) * slab.rate)
+            lowers.append(float(slab.up_to))
+        else:
+            rates.append(0.0)  # income above the last bounded slab is untaxed
+        arrays = None
+        if np is not None:
+            arrays = (np.array(lowers), np.array(rates), np.array(base))
+        return cls(tuple(lowers), tuple(rates), tuple(base), arrays)
+
+    def tax(self, taxable: float) -> float:
+        if taxable <= 0:
+            return 0.0
+        i = bisect_left(self.lowers, taxable) - 1
+        return self.base[i] + (taxable - self.lowers[i]) * self.rates[i]
+
+    def max_taxable(self, tax: float) -> float:
+        """Largest taxable amount whose slab tax does not exceed `tax` (inverse of tax())."""
+        i = bisect_right(self.base, tax) - 1
+        if self.rates[i] == 0:
+            return math.inf  # only possible in the last, untaxed bracket
+        return self.lowers[i] + (tax - self.base[i]) / self.rates[i]
+
+    def linear(self, taxable: float) -> Tuple[float, float]:
+        """(intercept, slope) of the tax line in the bracket containing `taxable`."""
+        if taxable <= 0:
+            return 0.0, 0.0
+        i = bisect_left(self.lowers, taxable) - 1
+        return self.base[i] - self.lowers[i] * self.rates[i], self.rates[i]
+
+    def tax_many(self, taxable):
+        lowers, rates, base = self.arrays
+        i = np.maximum(np.searchsorted(lowers, taxable, side="left") - 1, 0)
+        tax = base[i] + (taxable - lowers[i]) * rates[i]
+        return np.where(taxable > 0, tax, 0.0)
+
+
+@dataclass(frozen=True)
+class CompiledRegime:
+    """
+    A regime's full schedule precompiled for lookup. `slabs` gives the base tax;
+    income `bands` (split at the rebate threshold and each surcharge threshold)
+    carry the surcharge rate and the marginal-relief cap, which says that the
+    tax plus surcharge may not exceed `relief[i] + taxable` (the tax at the band's
+    threshold plus the income above it). `points`/`intercepts`/`slopes` hold the
+    resulting pre-cess tax as a piecewise-linear function of taxable income, used
+    for inversion and regime comparison. On (`plain_from`, `plain_up_to`] neither
+    surcharge nor marginal relief applies, so lookups there skip the bands.
+    """
+    slabs: CompiledSlabs
+    rebate_threshold: float
+    bands: Tuple[float, ...]
+    surcharge: Tuple[float, ...]
+    relief: Tuple[float, ...]  # math.inf where no relief applies
+    points: Tuple[float, ...]
+    intercepts: Tuple[float, ...]
+    slopes: Tuple[float, ...]
+    starts: Tuple[float, ...]  # pre-cess tax just above each point
+    plain_from: float = math.inf
+    plain_up_to: float = -math.inf
+    arrays: Optional[tuple] = field(default=None, compare=False, repr=False)  # NumPy mirrors for terms_many
+
+    @classmethod
+    def compile(cls, slabs, rebate_threshold: float, rebate_relief: bool, surcharge) -> "CompiledRegime":
+        table = CompiledSlabs.compile(list(slabs))
+        sur = CompiledSlabs.compile(list(surcharge))  # only lowers/rates are used: rate by income bracket
+        rebate_point = {float(rebate_threshold)} if rebate_threshold > 0 else set()
+        bands = sorted(set(sur.lowers) | (rebate_point if rebate_relief else set()))
+        rates = [sur.rates[bisect_right(sur.lowers, b) - 1] for b in bands]
+        draft = cls(table, float(rebate_threshold), tuple(bands), tuple(rates), (math.inf,) * len(bands),
+                    (), (), (), ())
+        for i in range(1, len(bands)):
+            if rebate_relief and bands[i] == rebate_threshold:
+                cap = -bands[i]  # tax may not exceed the income above the rebate threshold
+            elif rates[i] > rates[i - 1]:
+                cap = draft.payable(bands[i]) - bands[i]  # tax at the threshold plus the income above it
+            else:
+                continue
+            draft = replace(draft, relief=draft.relief[:i] + (cap,) + draft.relief[i + 1:])
+
+        # Pieces between slab, band, rebate and relief-crossover points are linear
+        points = sorted(set(table.lowers) | set(bands) | rebate_point)
+        crossings = []
+        for lo, hi in zip(points, points[1:] + [math.inf]):
+            (a, b), cap = draft._lines(lo, hi)
+            if cap != math.inf and b != 1:
+                x = (cap - a) / (b - 1)
+                if lo < x < hi:
+                    crossings.append(x)
+        points = sorted(points + crossings)
+        intercepts, slopes, starts, plain = [], [], [], []
+        for lo, hi in zip(points, points[1:] + [math.inf]):
+            (a, b), cap = draft._lines(lo, hi)
+            x = (lo + hi) / 2 if hi != math.inf else lo + 1.0
+            if cap + x < a + b * x:
+                a, b = cap, 1.0
+            elif lo >= rebate_threshold and (a, b) == table.linear(x):
+                plain.append((lo, hi))  # slab tax alone: no surcharge, no relief
+            intercepts.append(a)
+            slopes.append(b)
+            starts.append(a + b * lo)
+        # The first run of plain pieces is the fast path of terms()/terms_many()
+        plain_from, plain_up_to = plain[0] if plain else (math.inf, -math.inf)
+        for lo, hi in plain[1:]:
+            if lo != plain_up_to:
+                break
+            plain_up_to = hi
+        relief = draft.relief
+        arrays = None
+        if np is not None:
+            arrays = (np.array(bands), np.array(rates), np.array(relief))
+        return cls(table, float(rebate_threshold), tuple(bands), tuple(rates), relief,
+                   tuple(points), tuple(intercepts), tuple(slopes), tuple(starts),
+                   plain_from, plain_up_to, arrays)
+
+    def _lines(self, lo: float, hi: float) -> Tuple[Tuple[float, float], float]:
+        """((intercept, slope) of tax plus surcharge, relief intercept) on the piece (lo, hi]."""
+        x = (lo + hi) / 2 if hi != math.inf else lo + 1.0
+        i = max(bisect_left(self.bands, x) - 1, 0)
+        if x <= self.rebate_threshold:
+            return (0.0, 0.0), self.relief[i]
+        a, b = self.slabs.linear(x)
+        k = 1 + self.surcharge[i]
+        return (a * k, b * k), self.relief[i]
+
+    def terms(self, taxable: float) -> Tuple[float, float, float, float]:
+        """(base_tax, rebate, surcharge, marginal_relief) for one taxable income."""
+        if taxable <= 0:
+            return 0.0, 0.0, 0.0, 0.0
+        slabs = self.slabs  # CompiledSlabs.tax() inlined: this is the per-row hot path
+        j = bisect_left(slabs.lowers, taxable) - 1
+        base_tax = slabs.base[j] + (taxable - slabs.lowers[j]) * slabs.rates[j]
+        if taxable <= self.rebate_threshold:
+            return base_tax, base_tax, 0.0, 0.0
+        if self.plain_from < taxable <= self.plain_up_to:
+            return base_tax, 0.0, 0.0, 0.0
+        i = bisect_left(self.bands, taxable) - 1
+        cap = self.relief[i]
+        surcharge = base_tax * self.surcharge[i]
+        if cap == math.inf:
+            return base_tax, 0.0, surcharge, 0.0
+        return base_tax, 0.0, surcharge, max(0.0, base_tax + surcharge - (cap + taxable))
+
+    def terms_many(self, taxable):
+        """terms() over an array, matching it element for element."""
+        base_tax = self.slabs.tax_many(taxable)
+        rebate = np.where(taxable <= self.rebate_threshold, base_tax, 0.0)
+        tax = np.maximum(0.0, base_tax - rebate)
+        surcharge, relief = np.zeros_like(tax), np.zeros_like(tax)
+        rows = np.flatnonzero(self.off_plain(taxable))
+        if rows.size:
+            surcharge[rows], relief[rows] = self.surcharge_many(taxable[rows], tax[rows])
+        return base_tax, rebate, surcharge, relief
+
+    def off_plain(self, taxable):
+        """Mask of taxable incomes above the rebate threshold but outside the plain range."""
+        off = taxable > self.plain_up_to
+        if self.plain_from > self.rebate_threshold:
+            off |= (taxable > self.rebate_threshold) & (taxable <= self.plain_from)
+        return off
+
+    def surcharge_many(self, taxable, tax):
+        """(surcharge, marginal_relief) arrays for `tax` after rebate, by band lookup."""
+        bands, rates, caps = self.arrays
+        i = np.maximum(np.searchsorted(bands, taxable, side="left") - 1, 0)
+        surcharge = tax * rates[i]
+        return surcharge, np.maximum(0.0, tax + surcharge - (caps[i] + taxable))
+
+    def payable(self, taxable: float) -> float:
+        """Pre-cess tax: base tax after rebate, plus surcharge, minus marginal relief."""
+        base_tax, rebate, surcharge, relief = self.terms(taxable)
+        return max(0.0, base_tax - rebate) + surcharge - relief
+
+    def linear(self, taxable: float) -> Tuple[float, float]:
+        """(intercept, slope) of the pre-cess tax line around `taxable`."""
+        if taxable <= 0:
+            return 0.0, 0.0
+        j = bisect_left(self.points, taxable) - 1
+        return self.intercepts[j], self.slopes[j]
+
+    def max_taxable(self, tax: float) -> float:
+        """Largest taxable income whose pre-cess tax does not exceed `tax`."""
+        j = max(bisect_right(self.starts, tax) - 1, 0)
+        end = self.points[j + 1] if j + 1 < len(self.points) else math.inf
+        if self.slopes[j] == 0:
+            return end
+        return min(self.points[j] + (tax - self.starts[j]) / self.slopes[j], end)
+
+
+# ------------------- Rule packs -------------------
+
+TAX_RULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tax_rules")
+
+RuleSlab = namedtuple("RuleSlab", "up_to rate")  # hashable TaxSlab
+
+
+def normalize_fy(fy) -> str:
+    """'FY2024-25', 'fy 2024-2025', '2024' or 2024 -> '2024-25' (a year is named by its start)."""
+    m = re.fullmatch(r"(?:fy\s*)?(\d{4})(?:\s*[-/]\s*(\d{2}|\d{4}))?", str(fy).strip(), re.IGNORECASE)
+    if m is None:
+        raise ValueError(f"not a financial year: {fy!r}")
+    start = int(m.group(1))
+    if m.group(2) is not None and int(m.group(2)) % 100 != (start + 1) % 100:
+        raise ValueError(f"not a financial year: {fy!r}")
+    return f"{start}-{(start + 1) % 100:02d}"
+
+
+_PACK_SLABS = ("slabs_new", "slabs_old", "surcharge_new", "surcharge_old")
+_PACK_FLAGS = ("rebate_relief_new", "rebate_relief_old")
+
+
+@lru_cache(maxsize=None)
+def _compile_regime(slabs: Tuple[RuleSlab, ...], rebate_threshold: float, rebate_relief: bool,
+                    surcharge: Tuple[RuleSlab, ...]) -> CompiledRegime:
+    """One CompiledRegime per distinct schedule, shared by every year that uses it."""
+    return CompiledRegime.compile(slabs, rebate_threshold, rebate_relief, surcharge)
+
+
+def _pack_number(name: str, value) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value < 0:
+        raise ValueError(f"{name} must be a non-negative number, got {value!r}")
+    return float(value)
+
+
+def _pack_slabs(name: str, raw, allow_empty: bool = False) -> Tuple[RuleSlab, ...]:
+    if not isinstance(raw, list) or not (raw or allow_empty):
+        raise ValueError(f"{name} must be a non-empty list of slabs")
+    slabs = []
+    for slab in raw:
+        if isinstance(slab, dict) and set(slab) <= {"up_to", "rate"}:
+            up_to, rate = slab.get("up_to"), slab.get("rate")
+        elif isinstance(slab, list) and len(slab) == 2:
+            up_to, rate = slab
+        else:
+            raise ValueError(f"{name}: each slab is [up_to, rate] or {{up_to = ..., rate = ...}}, got {slab!r}")
+        rate = _pack_number(f"{name} rate", rate)
+        if rate > 1:
+            raise ValueError(f"{name}: rate {rate} is above 1 (rates are fractions, e.g. 0.05)")
+        slabs.append(RuleSlab(None if up_to is None else _pack_number(f"{name} up_to", up_to), rate))
+    return tuple(slabs)
+
+
+@dataclass(frozen=True)
+class TaxRules:
+    """
+    Immutable, hashable counterpart of TaxConfig for one financial year, with
+    its slab tables compiled at construction. Usually obtained from TAX_RULES.
+    """
+    fy: str
+    rebate_threshold_new: float
+    rebate_threshold_old: float
+    std_deduction_new: float
+    std_deduction_old: float
+    max_80C_old: float
+    max_80D_old: float
+    rebate_relief_new: bool
+    rebate_relief_old: bool
+    cess_rate: float
+    slabs_new: Tuple[RuleSlab, ...]
+    slabs_old: Tuple[RuleSlab, ...]
+    surcharge_new: Tuple[RuleSlab, ...]
+    surcharge_old: Tuple[RuleSlab, ...]
+    tables: Tuple[CompiledRegime, CompiledRegime] = field(default=None, compare=False, repr=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "tables", (
+            _compile_regime(self.slabs_new, self.rebate_threshold_new, self.rebate_relief_new, self.surcharge_new),
+            _compile_regime(self.slabs_old, self.rebate_threshold_old, self.rebate_relief_old, self.surcharge_old),
+        ))
+
+    def fingerprint(self) -> tuple:
+        return tuple(getattr(self, f.name) for f in fields(self) if f.compare)
+
+    @classmethod
+    def from_config(cls, cfg: TaxConfig, fy: str = "custom") -> "TaxRules":
+        values = {f.name: getattr(cfg, f.name) for f in fields(TaxConfig)}
+        for name in _PACK_SLABS:
+            values[name] = tuple(RuleSlab(s.up_to, s.rate) for s in values[name])
+        return cls(fy=fy, **values)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TaxRules":
+        """Validate a rule pack as loaded from JSON/TOML; raises ValueError naming the bad key."""
+        if not isinstance(data, dict):
+            raise ValueError("a tax rule pack must be a mapping")
+        expected = {f.name for f in fields(cls) if f.compare}
+        missing = expected - set(data)
+        if missing:
+            raise ValueError(f"missing keys: {', '.join(sorted(missing))}")
+        unknown = set(data) - expected - {"description"}
+        if unknown:
+            raise ValueError(f"unknown keys: {', '.join(sorted(unknown))}")
+        values = {"fy": normalize_fy(data["fy"])}
+        for name in expected - {"fy", *_PACK_SLABS, *_PACK_FLAGS}:
+            values[name] = _pack_number(name, data[name])
+        if values["cess_rate"] > 1:
+            raise ValueError("cess_rate is a fraction, e.g. 0.04")
+        for name in _PACK_FLAGS:
+            if not isinstance(data[name], bool):
+                raise ValueError(f"{name} must be true or false, got {data[name]!r}")
+            values[name] = data[name]
+        for name in _PACK_SLABS:
+            values[name] = _pack_slabs(name, data[name], allow_empty=name.startswith("surcharge"))
+        return cls(**values)  # compiling checks slab ordering
+
+
+def load_tax_rules(path: str) -> TaxRules:
+    """Read and validate one rule pack (.json, or .toml on Python 3.11+)."""
+    if path.endswith(".toml"):
+        if tomllib is None:
+            raise ImportError("TOML tax rule packs require Python 3.11+ (tomllib)")
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    else:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    try:
+        return TaxRules.from_dict(data)
+    except ValueError as e:
+        raise ValueError(f"{path}: {e}") from None
+
+
+class TaxRuleRegistry:
+    """
+    Tax rules by financial year. Packs are the *.json/*.toml files in `directory`,
+    named by year (FY2025-26.json); each is loaded, validated and compiled on first
+    request, and that one TaxRules (tables included) is handed to every caller.
+    """
+    def __init__(self, directory: Optional[str] = TAX_RULES_DIR):
+        self.directory = directory
+        self._rules: Dict[str, TaxRules] = {}
+        self._paths: Optional[Dict[str, str]] = None
+        self._lock = threading.Lock()
+
+    def _scan(self) -> Dict[str, str]:
+        if self._paths is None:
+            paths = {}
+            if self.directory and os.path.isdir(self.directory):
+                for name in sorted(os.listdir(self.directory)):
+                    stem, ext = os.path.splitext(name)
+                    if ext in (".json", ".toml"):
+                        paths[normalize_fy(stem)] = os.path.join(self.directory, name)
+            self._paths = paths
+        return self._paths
+
+    def years(self) -> List[str]:
+        return sorted(set(self._scan()) | set(self._rules))
+
+    def get(self, fy) -> TaxRules:
+        key = normalize_fy(fy)
+        rules = self._rules.get(key)
+        if rules is not None:
+            return rules
+        with self._lock:
+            rules = self._rules.get(key)
+            if rules is None:
+                path = self._scan().get(key)
+                if path is None:
+                    raise ValueError(f"no tax rules for FY {key} (available: {', '.join(self.years()) or 'none'})")
+                rules = load_tax_rules(path)
+                if rules.fy != key:
+                    raise ValueError(f"{path}: declares FY {rules.fy}, file name says {key}")
+                self._rules[key] = rules
+        return rules
+
+    def register(self, rules: TaxRules) -> TaxRules:
+        """Add (or replace) the rules for `rules.fy`, e.g. a pack built in code."""
+        with self._lock:
+            self._rules[rules.fy] = rules
+        return rules
+
+
+TAX_RULES = TaxRuleRegistry()
+
+
 class IndiaTaxCalculator:
-    def __init__(self, cfg: TaxConfig | None = None):
+    def __init__(self, cfg: TaxConfig | TaxRules | str | None = None, cache_size: int = 0):
+        """
+        `cfg` is a TaxConfig, compiled TaxRules or a financial year ("2025-26")
+        looked up in TAX_RULES. `cache_size` > 0 enables an LRU memo of
+        estimate() results (off by default).
+        """
         self.cfg = cfg or TaxConfig()
+        self._cache_size = max(0, int(cache_size))
+        self._cache: "OrderedDict[tuple, Dict[str, float]]" = OrderedDict()
+        self._hits = self._misses = self._evictions = 0
 
-    def _slab_tax(self, taxable: float, slabs: List[TaxSlab]) -> float:
-        tax = 0.0
-        lower = 0.0
-        for slab in slabs:
-            upper = slab.up_to if slab.up_to is not None else taxable
-            if taxable > lower:
-                segment = min(taxable, upper) - lower
-                if segment > 0:
-                    tax += segment * slab.rate
-            lower = upper
-            if taxable <= lower:
-                break
-        return tax
+    @property
+    def cfg(self) -> TaxConfig | TaxRules:
+        return self._cfg
+
+    @cfg.setter
+    def cfg(self, cfg: TaxConfig | TaxRules | str) -> None:
+        if not isinstance(cfg, (TaxConfig, TaxRules)):
+            cfg = TAX_RULES.get(cfg)
+        self._cfg = cfg
+        self._tables = None
+        self._cfg_key = None
+        self._edits_seen = -1
+
+    @property
+    def fy(self) -> Optional[str]:
+        """Financial year of the active rules (None for a plain TaxConfig)."""
+        return getattr(self._cfg, "fy", None)
+
+    def use_year(self, fy) -> "IndiaTaxCalculator":
+        """Switch to the registered rules for `fy`; their compiled tables are reused, not rebuilt."""
+        self.cfg = TAX_RULES.get(fy)
+        return self
+
+    def refresh_tables(self) -> None:
+        """Drop compiled slab tables (edits to `cfg` are picked up automatically)."""
+        self._tables = None
+        self._cfg_key = None
+        self._edits_seen = -1
+
+    def _sync(self) -> None:
+        """After any TaxConfig/TaxSlab edit, re-fingerprint `cfg`; drop the tables if it changed."""
+        if self._edits_seen != _tax_edits:
+            self._edits_seen = _tax_edits
+            key = self._cfg.fingerprint()
+            if key != self._cfg_key:
+                self._cfg_key = key
+                self._tables = None
+
+    def _compiled(self) -> Tuple[CompiledRegime, CompiledRegime]:
+        """(new, old) regime tables, compiled on first use after a config change."""
+        if self._edits_seen != _tax_edits:
+            self._sync()
+        if self._tables is None:
+            cfg = self._cfg
+            if isinstance(cfg, TaxRules):
+                self._tables = cfg.tables
+            else:
+                self._tables = (
+                    CompiledRegime.compile(cfg.slabs_new, cfg.rebate_threshold_new, cfg.rebate_relief_new,
+                                           cfg.surcharge_new),
+                    CompiledRegime.compile(cfg.slabs_old, cfg.rebate_threshold_old, cfg.rebate_relief_old,
+                                           cfg.surcharge_old),
+                )
+        return self._tables
 
     def estimate(self,
                  gross_annual_income: float,
@@ -145,6 +1222,48 @@ class IndiaTaxCalculator:
                  deductions_old_80C: float = 0.0,
                  deductions_old_80D: float = 0.0) -> Dict[str, float]:
         """Return detailed tax estimate for India."""
+        if not self._cache_size:
+            return self._estimate(gross_annual_income, is_salaried, regime, deductions_old_80C, deductions_old_80D)
+
+        # Normalize so equivalent queries share an entry (80C/80D only matter, clamped, in the old regime)
+        regime = regime.lower().strip()
+        is_salaried = bool(is_salaried)
+        if regime == "old":
+            cfg = self.cfg
+            d80c = min(cfg.max_80C_old, max(0.0, float(deductions_old_80C)))
+            d80d = min(cfg.max_80D_old, max(0.0, float(deductions_old_80D)))
+        else:
+            regime, d80c, d80d = "new", 0.0, 0.0
+        self._sync()  # re-fingerprints the config after in-place edits
+        key = (float(gross_annual_income), is_salaried, regime, d80c, d80d, self._cfg_key)
+
+        cache = self._cache
+        res = cache.get(key)
+        if res is not None:
+            self._hits += 1
+            cache.move_to_end(key)
+        else:
+            self._misses += 1
+            res = self._estimate(float(gross_annual_income), is_salaried, regime, d80c, d80d)
+            cache[key] = res
+            if len(cache) > self._cache_size:
+                cache.popitem(last=False)
+                self._evictions += 1
+        return dict(res)  # callers may mutate their copy
+
+    def cache_info(self) -> TaxCacheInfo:
+        return TaxCacheInfo(self._hits, self._misses, self._evictions, self._cache_size, len(self._cache))
+
+    def cache_clear(self) -> None:
+        self._cache.clear()
+        self._hits = self._misses = self._evictions = 0
+
+    def _estimate(self,
+                  gross_annual_income: float,
+                  is_salaried: bool,
+                  regime: str,
+                  deductions_old_80C: float,
+                  deductions_old_80D: float) -> Dict[str, float]:
         cfg = self.cfg
         regime = regime.lower().strip()
         if regime not in ("new", "old"):
@@ -155,12 +1274,11 @@ class IndiaTaxCalculator:
 
         if regime == "new":
             taxable = max(0.0, gross_annual_income - std_deduction)
-            base_tax = self._slab_tax(taxable, cfg.slabs_new)
-            # Rebate u/s 87A (new)
-            rebate = base_tax if taxable <= cfg.rebate_threshold_new else 0.0
-            tax_after_rebate = max(0.0, base_tax - rebate)
-            cess = tax_after_rebate * cfg.cess_rate
-            total = tax_after_rebate + cess
+            # Rebate u/s 87A, surcharge and marginal relief (new)
+            base_tax, rebate, surcharge, relief = self._compiled()[0].terms(taxable)
+            tax_payable = max(0.0, base_tax - rebate) + surcharge - relief
+            cess = tax_payable * cfg.cess_rate
+            total = tax_payable + cess
             return {
                 "regime": 1.0,  # 1=new, 0=old for convenience
                 "gross": gross_annual_income,
@@ -169,6 +1287,8 @@ class IndiaTaxCalculator:
                 "taxable": taxable,
                 "base_tax": base_tax,
                 "rebate": rebate,
+                "surcharge": surcharge,
+                "marginal_relief": relief,
                 "cess": cess,
                 "total_tax": total,
                 "effective_rate": total / gross_annual_income if gross_annual_income else 0.0,
@@ -178,11 +1298,10 @@ class IndiaTaxCalculator:
             d80d = min(cfg.max_80D_old, max(0.0, deductions_old_80D))
             deductions = d80c + d80d + (std_deduction if is_salaried else 0.0)
             taxable = max(0.0, gross_annual_income - deductions)
-            base_tax = self._slab_tax(taxable, cfg.slabs_old)
-            rebate = base_tax if taxable <= cfg.rebate_threshold_old else 0.0
-            tax_after_rebate = max(0.0, base_tax - rebate)
-            cess = tax_after_rebate * cfg.cess_rate
-            total = tax_after_rebate + cess
+            base_tax, rebate, surcharge, relief = self._compiled()[1].terms(taxable)
+            tax_payable = max(0.0, base_tax - rebate) + surcharge - relief
+            cess = tax_payable * cfg.cess_rate
+            total = tax_payable + cess
             return {
                 "regime": 0.0,
                 "gross": gross_annual_income,
@@ -191,38 +1310,452 @@ class IndiaTaxCalculator:
                 "taxable": taxable,
                 "base_tax": base_tax,
                 "rebate": rebate,
+                "surcharge": surcharge,
+                "marginal_relief": relief,
                 "cess": cess,
                 "total_tax": total,
                 "effective_rate": total / gross_annual_income if gross_annual_income else 0.0,
             }
 
-# ----------------------------- Planning Calculators -----------------------------
+    # ------------------- Batch (NumPy) -------------------
+    @staticmethod
+    def _is_new_regime(regime):
+        """Boolean mask: True where the new regime applies (anything but 'old', as in estimate)."""
+        arr = np.asarray(regime)
+        if arr.dtype.kind in "USO":
+            return np.char.strip(np.char.lower(arr.astype(str))) != "old"
+        return arr != 0  # numeric codes as returned by estimate: 1=new, 0=old
 
-def future_value_sip(monthly: float, annual_return_pct: float, years: float) -> float:
-    r = annual_return_pct / 100.0 / 12.0
-    n = int(round(years * 12))
-    if r == 0:
-        return monthly * n
-    return monthly * ((1 + r) ** n - 1) / r * (1 + r)
+    def estimate_many(self,
+                      gross_annual_income,
+                      is_salaried=True,
+                      regime="new",
+                      deductions_old_80C=0.0,
+                      deductions_old_80D=0.0) -> Dict[str, "np.ndarray"]:
+        """
+        Vectorized estimate() over arrays of incomes.
+        Inputs broadcast against each other; `regime` may be a string, an array of
+        'new'/'old' strings or the 1/0 codes used in estimate()'s output.
+        Returns one array per key of estimate().
+        """
+        _require_numpy("estimate_many")
+        cfg = self.cfg
+        gross, salaried, is_new, d80c, d80d = np.broadcast_arrays(
+            np.asarray(gross_annual_income, dtype=float),
+            np.asarray(is_salaried, dtype=bool),
+            self._is_new_regime(regime),
+            np.asarray(deductions_old_80C, dtype=float),
+            np.asarray(deductions_old_80D, dtype=float),
+        )
+        gross = gross.astype(float)  # writable, owned copy
 
+        std_deduction = np.where(salaried, np.where(is_new, cfg.std_deduction_new, cfg.std_deduction_old), 0.0)
 
-def required_sip(target: float, annual_return_pct: float, years: float) -> float:
-    r = annual_return_pct / 100.0 / 12.0
-    n = int(round(years * 12))
-    if r == 0:
-        return target / n
-    return target / (((1 + r) ** n - 1) / r * (1 + r))
+        # New regime
+        taxable_new = np.maximum(0.0, gross - std_deduction)
+        # Old regime
+        d80c = np.minimum(cfg.max_80C_old, np.maximum(0.0, d80c))
+        d80d = np.minimum(cfg.max_80D_old, np.maximum(0.0, d80d))
+        deductions_old = d80c + d80d + std_deduction
+        taxable_old = np.maximum(0.0, gross - deductions_old)
 
+        taxable = np.where(is_new, taxable_new, taxable_old)
+        tables_new, tables_old = self._compiled()
+        base_tax = np.empty_like(taxable)
+        base_tax[is_new] = tables_new.slabs.tax_many(taxable[is_new])
+        base_tax[~is_new] = tables_old.slabs.tax_many(taxable[~is_new])
 
-def emi(principal: float, annual_rate_pct: float, years: float) -> float:
-    r = annual_rate_pct / 100.0 / 12.0
-    n = int(round(years * 12))
-    if r == 0:
-        return principal / n
-    return principal * r * (1 + r) ** n / ((1 + r) ** n - 1)
+        threshold = np.where(is_new, tables_new.rebate_threshold, tables_old.rebate_threshold)
+        rebate = np.where(taxable <= threshold, base_tax, 0.0)
+        tax_payable = tax_after_rebate = np.maximum(0.0, base_tax - rebate)
 
+        # Surcharge and marginal relief: only rows off each regime's plain range need a band lookup
+        surcharge, relief = np.zeros_like(taxable), np.zeros_like(taxable)
+        for regime_tables, mask in ((tables_new, is_new), (tables_old, ~is_new)):
+            rows = np.flatnonzero(mask & regime_tables.off_plain(taxable))
+            if rows.size:
+                surcharge[rows], relief[rows] = regime_tables.surcharge_many(taxable[rows], tax_after_rebate[rows])
+                tax_payable = tax_after_rebate + surcharge - relief
+        cess = tax_payable * cfg.cess_rate
+        total = tax_payable + cess
+        with np.errstate(divide="ignore", invalid="ignore"):
+            effective_rate = np.where(gross != 0, total / np.where(gross != 0, gross, 1.0), 0.0)
 
-def retirement_target(monthly_expense_today: float, years_to_retire: int, retired_years: int,
+        return {
+            "regime": is_new.astype(float),
+            "gross": gross,
+            "std_deduction": std_deduction,
+            "deductions": np.where(is_new, 0.0, deductions_old - std_deduction),
+            "taxable": taxable,
+            "base_tax": base_tax,
+            "rebate": rebate,
+            "surcharge": surcharge,
+            "marginal_relief": relief,
+            "cess": cess,
+            "total_tax": total,
+            "effective_rate": effective_rate,
+        }
+
+    # ------------------- Old vs New breakeven -------------------
+    def _regime_offsets(self, is_salaried: bool, deductions_old: float) -> Tuple[float, float]:
+        """Amounts subtracted from gross income to get taxable income: (new, old)."""
+        cfg = self.cfg
+        deductions_old = min(cfg.max_80C_old + cfg.max_80D_old, max(0.0, deductions_old))
+        if not is_salaried:
+            return 0.0, deductions_old
+        return cfg.std_deduction_new, cfg.std_deduction_old + deductions_old
+
+    def regime_intervals(self,
+                         income_lo: float,
+                         income_hi: float,
+                         is_salaried: bool = True,
+                         deductions_old: float = 0.0) -> List[RegimeInterval]:
+        """
+        Split [income_lo, income_hi] into intervals where the old or the new regime
+        is cheaper, given total 80C+80D deductions claimed under the old regime.
+        Tax in each regime is piecewise linear in gross income, so the difference
+        is solved exactly on each piece between slab, rebate, surcharge and relief
+        breakpoints.
+        """
+        if income_lo > income_hi:
+            raise ValueError(f"income_lo ({income_lo}) is above income_hi ({income_hi})")
+        tables_new, tables_old = self._compiled()
+        off_new, off_old = self._regime_offsets(is_salaried, deductions_old)
+        regimes = ((tables_new, off_new), (tables_old, off_old))
+
+        points = {income_lo, income_hi}
+        for tables, off in regimes:
+            points.update(off + b for b in tables.points)
+        points = sorted(p for p in points if income_lo <= p <= income_hi)
+
+        def line(tables, off, g):
+            # pre-cess tax; cess scales both regimes equally so it cannot move a breakeven
+            a, b = tables.linear(g - off)
+            return a - b * off, b
+
+        def label(diff: float) -> str:
+            return "old" if diff < 0 else ("new" if diff > 0 else "either")
+
+        out: List[RegimeInterval] = []
+
+        def push(lo: float, hi: float, better: str) -> None:
+            if out and out[-1].better == better:
+                out[-1].hi = hi
+            else:
+                out.append(RegimeInterval(lo, hi, better))
+
+        for lo, hi in zip(points, points[1:]):
+            mid = (lo + hi) / 2
+            a_new, b_new = line(*regimes[0], mid)
+            a_old, b_old = line(*regimes[1], mid)
+            da, db = a_old - a_new, b_old - b_new  # old - new = da + db * g
+            if db == 0:
+                push(lo, hi, label(da))
+                continue
+            root = -da / db
+            if lo < root < hi:
+                push(lo, root, label(da + db * lo))
+                push(root, hi, label(da + db * hi))
+            else:
+                push(lo, hi, label(da + db * mid))
+        if not out:  # income_lo == income_hi: no pieces, compare the two taxes at that income
+            tax_new, tax_old = (tables.payable(max(0.0, income_lo - off)) for tables, off in regimes)
+            out.append(RegimeInterval(income_lo, income_hi, label(tax_old - tax_new)))
+        return out
+
+    def breakeven_deductions(self, gross_annual_income: float, is_salaried: bool = True) -> Optional[float]:
+        """
+        Smallest total 80C+80D at which the old regime costs no more than the new one.
+        Returns 0.0 if the old regime already wins with no deductions, None if even
+        the maximum allowed deductions are not enough.
+        """
+        cfg = self.cfg
+        new_tax = self.estimate(gross_annual_income, is_salaried, "new")
+        target = new_tax["total_tax"] - new_tax["cess"]  # compare before cess
+        # Old-regime taxable income may go up to this and still cost <= target
+        max_taxable = self._compiled()[1].max_taxable(target)
+        _, off_old = self._regime_offsets(is_salaried, 0.0)
+        needed = gross_annual_income - off_old - max_taxable
+        if needed <= 0:
+            return 0.0
+        if needed > cfg.max_80C_old + cfg.max_80D_old:
+            return None
+        return needed
+
+
+
+_YEAR_CALCULATORS: Dict[str, IndiaTaxCalculator] = {}
+
+
+def year_calculator(fy) -> IndiaTaxCalculator:
+    """
+    Shared calculator for a financial year in TAX_RULES (one per year per process).
+    It is rebuilt whenever the registry hands out a different TaxRules for the
+    year, e.g. after TAX_RULES.register() replaced it.
+    """
+    rules = TAX_RULES.get(fy)
+    calc = _YEAR_CALCULATORS.get(rules.fy)
+    if calc is None or calc.cfg is not rules:
+        calc = _YEAR_CALCULATORS[rules.fy] = IndiaTaxCalculator(rules)
+    return calc
+
+# ----------------------------- Planning Calculators -----------------------------
+
+def future_value_sip(monthly: float, annual_return_pct: float, years: float) -> float:
+    r = annual_return_pct / 100.0 / 12.0
+    n = int(round(years * 12))
+    if r == 0:
+        return monthly * n
+    return monthly * ((1 + r) ** n - 1) / r * (1 + r)
+
+
+def required_sip(target: float, annual_return_pct: float, years: float) -> float:
+    r = annual_return_pct / 100.0 / 12.0
+    n = int(round(years * 12))
+    if r == 0:
+        return target / n
+    return target / (((1 + r) ** n - 1) / r * (1 + r))
+
+
+def _pow_exact(base, exp):
+    """
+    Elementwise base ** exp computed with the C library pow that Python floats use
+    (NumPy's SIMD pow can differ in the last ulp). Only distinct (base, exp) pairs
+    are evaluated, which for parameter grids is a tiny fraction of the cells.
+    """
+    base, exp = np.broadcast_arrays(np.asarray(base, dtype=float), np.asarray(exp, dtype=float))
+    pairs, inverse = np.unique(np.stack([base.ravel(), exp.ravel()], axis=1), axis=0, return_inverse=True)
+    powers = np.array([b ** e for b, e in pairs.tolist()], dtype=float)
+    return powers[inverse.ravel()].reshape(base.shape)
+
+
+def _sip_terms(annual_return_pct, years):
+    """(r, n, (1 + r) ** n, r == 0 mask, r with zeros replaced) for the vectorized SIP formulas."""
+    r = np.asarray(annual_return_pct, dtype=float) / 100.0 / 12.0
+    n = np.rint(np.asarray(years, dtype=float) * 12)  # round-half-even, like round()
+    zero = r == 0
+    return r, n, _pow_exact(1 + r, n), zero, np.where(zero, 1.0, r)
+
+
+def future_value_sip_many(monthly, annual_return_pct, years) -> "np.ndarray":
+    """
+    future_value_sip over arrays; arguments broadcast, so a full heatmap grid is
+    e.g. future_value_sip_many(m[:, None, None], rates[None, :, None], yrs[None, None, :]).
+    Operations are ordered as in the scalar formula, so results are identical.
+    """
+    _require_numpy("future_value_sip_many")
+    monthly = np.asarray(monthly, dtype=float)
+    r, n, growth, zero, safe_r = _sip_terms(annual_return_pct, years)
+    return np.where(zero, monthly * n, monthly * (growth - 1) / safe_r * (1 + r))
+
+
+def required_sip_many(target, annual_return_pct, years) -> "np.ndarray":
+    """required_sip over broadcast arrays (see future_value_sip_many)."""
+    _require_numpy("required_sip_many")
+    target = np.asarray(target, dtype=float)
+    r, n, growth, zero, safe_r = _sip_terms(annual_return_pct, years)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(zero, target / n, target / ((growth - 1) / safe_r * (1 + r)))
+
+
+def emi(principal: float, annual_rate_pct: float, years: float) -> float:
+    r = annual_rate_pct / 100.0 / 12.0
+    n = int(round(years * 12))
+    if r == 0:
+        return principal / n
+    return principal * r * (1 + r) ** n / ((1 + r) ** n - 1)
+
+
+@dataclass
+class AmortizationSchedule:
+    """Month-by-month loan schedule stored as parallel array('d') columns."""
+    emi: float
+    opening: array
+    interest: array
+    principal: array
+    closing: array
+
+    def __len__(self) -> int:
+        return len(self.opening)
+
+    @property
+    def total_interest(self) -> float:
+        return math.fsum(self.interest)
+
+    def rows(self) -> Iterator[Tuple[int, float, float, float, float]]:
+        return zip(range(1, len(self) + 1), self.opening, self.interest, self.principal, self.closing)
+
+
+def iter_amortization(principal: float, annual_rate_pct: float,
+                      years: float) -> Iterator[Tuple[int, float, float, float, float]]:
+    """
+    Lazily yield (month, opening, interest, principal, closing) rows; constant memory
+    for any tenure. The last instalment absorbs rounding so the loan closes at exactly 0.
+    """
+    r = annual_rate_pct / 100.0 / 12.0
+    n = int(round(years * 12))
+    m = emi(principal, annual_rate_pct, years)
+    balance = float(principal)
+    for month in range(1, n + 1):
+        interest = balance * r
+        repaid = balance if month == n else m - interest
+        closing = balance - repaid
+        yield month, balance, interest, repaid, closing
+        balance = closing
+
+
+def amortization_schedule(principal: float, annual_rate_pct: float, years: float) -> AmortizationSchedule:
+    """Full schedule in preallocated array('d') columns (8 bytes per cell)."""
+    n = int(round(years * 12))
+    cols = [array('d', bytes(8 * n)) for _ in range(4)]
+    opening, interest, repaid, closing = cols
+    for i, row in enumerate(iter_amortization(principal, annual_rate_pct, years)):
+        _, opening[i], interest[i], repaid[i], closing[i] = row
+    return AmortizationSchedule(emi(principal, annual_rate_pct, years), *cols)
+
+
+def amortize_many(principal, annual_rate_pct, years) -> Dict[str, "np.ndarray"]:
+    """
+    Amortize a book of loans in one vectorized pass. Inputs broadcast to 1-D.
+    Returns "emi" and "months" per loan plus (loans x max_months) matrices
+    "opening", "interest", "principal", "closing"; cells past a loan's tenure are 0.
+    Balances use the closed form B_k = P(1+r)^k - EMI((1+r)^k - 1)/r.
+    """
+    _require_numpy("amortize_many")
+    p, rate, yrs = np.broadcast_arrays(*(np.atleast_1d(np.asarray(x, dtype=float))
+                                         for x in (principal, annual_rate_pct, years)))
+    r = rate / 100.0 / 12.0
+    n = np.rint(yrs * 12).astype(np.int64)
+    zero = r == 0
+    safe_r = np.where(zero, 1.0, r)
+    growth_n = (1 + r) ** n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        m = np.where(zero, p / n, p * r * growth_n / (growth_n - 1))
+
+    k = np.arange(int(n.max(initial=0)))[None, :]            # months already paid
+    growth = (1 + r[:, None]) ** k
+    opening = np.where(zero[:, None],
+                       p[:, None] - m[:, None] * k,
+                       p[:, None] * growth - m[:, None] * (growth - 1) / safe_r[:, None])
+    active = k < n[:, None]
+    last = k == n[:, None] - 1
+    opening = np.where(active, opening, 0.0)
+    interest = opening * r[:, None]
+    repaid = np.where(last, opening, np.where(active, m[:, None] - interest, 0.0))
+    return {
+        "emi": m,
+        "months": n,
+        "opening": opening,
+        "interest": interest,
+        "principal": repaid,
+        "closing": opening - repaid,
+    }
+
+
+@dataclass
+class LoanEvent:
+    """A change applied after `month` instalments have been paid."""
+    month: int
+    prepayment: float = 0.0                   # lump sum paid toward principal
+    annual_rate_pct: Optional[float] = None   # floating-rate reset from this point on
+    reduce: str = "tenure"                    # "tenure": keep EMI, finish sooner; "emi": keep end date
+
+
+@dataclass
+class LoanSimulation:
+    emi: float                  # instalment in force at the end
+    months: int                 # instalments actually paid
+    total_interest: float
+    baseline_interest: float    # interest with no events at all
+    interest_saved: float
+    event_savings: List[float]  # interest saved by each applied event (sums to interest_saved)
+
+
+def _loan_balance(balance: float, r: float, m: float, k: float) -> float:
+    """Outstanding balance after k instalments of m (closed form)."""
+    if r == 0:
+        return balance - m * k
+    g = (1 + r) ** k
+    return balance * g - m * (g - 1) / r
+
+
+def _loan_emi(balance: float, r: float, n: float) -> float:
+    if r == 0:
+        return balance / n
+    g = (1 + r) ** n
+    return balance * r * g / (g - 1)
+
+
+def _loan_months(balance: float, r: float, m: float) -> float:
+    """Instalments (possibly fractional) needed to clear `balance` paying m a month."""
+    if r == 0:
+        return balance / m
+    if m <= balance * r:
+        raise ValueError("EMI no longer covers the monthly interest; use reduce='emi'")
+    return -math.log(1 - balance * r / m) / math.log(1 + r)
+
+
+def _loan_interest(balance: float, r: float, m: float, n: float) -> float:
+    """Interest still to be paid when `balance` is cleared in n instalments of m (last one partial)."""
+    if balance <= 0:
+        return 0.0
+    full = max(0, math.ceil(n - 1e-9) - 1)
+    last = _loan_balance(balance, r, m, full) * (1 + r)
+    return m * full + last - balance
+
+
+def simulate_loan(principal: float, annual_rate_pct: float, years: float,
+                  events: List[LoanEvent] = ()) -> LoanSimulation:
+    """
+    Apply part-prepayments and rate resets to an EMI loan. The loan jumps from
+    event to event with closed-form balances, and each event's effect is priced
+    as the change in remaining interest from that point, so the cost is
+    O(len(events)) regardless of tenure.
+    """
+    r = annual_rate_pct / 100.0 / 12.0
+    n = int(round(years * 12))
+    m = emi(principal, annual_rate_pct, years)
+    baseline = m * n - principal
+
+    balance, remaining, paid_months, interest = float(principal), float(n), 0, 0.0
+    savings: List[float] = []
+    for ev in sorted(events, key=lambda e: e.month):
+        k = ev.month - paid_months
+        if k < 0 or k >= remaining or balance <= 0:
+            if k < 0:
+                raise ValueError("event month must not be negative")
+            break  # the loan is already closed by then
+        after = _loan_balance(balance, r, m, k)
+        interest += m * k - (balance - after)
+        balance, remaining, paid_months = after, remaining - k, ev.month
+        before = _loan_interest(balance, r, m, remaining)
+
+        balance -= min(max(0.0, ev.prepayment), balance)
+        if ev.annual_rate_pct is not None:
+            r = ev.annual_rate_pct / 100.0 / 12.0
+        if balance <= 0:
+            remaining = 0.0
+        elif ev.reduce == "emi":
+            remaining = math.ceil(remaining - 1e-9)
+            m = _loan_emi(balance, r, remaining)
+        elif ev.reduce == "tenure":
+            remaining = _loan_months(balance, r, m)
+        else:
+            raise ValueError(f"unknown reduce mode: {ev.reduce!r}")
+        savings.append(before - _loan_interest(balance, r, m, remaining))
+
+    interest += _loan_interest(balance, r, m, remaining)
+    months = paid_months + (math.ceil(remaining - 1e-9) if balance > 0 else 0)
+    return LoanSimulation(m, months, interest, baseline, baseline - interest, savings)
+
+
+def simulate_loans(principal: float, annual_rate_pct: float, years: float,
+                   scenarios: List[List[LoanEvent]]) -> List[LoanSimulation]:
+    """Run many what-if event lists against the same base loan."""
+    return [simulate_loan(principal, annual_rate_pct, years, events) for events in scenarios]
+
+
+def retirement_target(monthly_expense_today: float, years_to_retire: int, retired_years: int,
                       inflation_pct: float = 6.0, swr_pct: float = 3.5) -> Tuple[float, float]:
     """
     Estimate retirement corpus using a Safe Withdrawal Rate (SWR) model.
@@ -238,6 +1771,214 @@ def retirement_target(monthly_expense_today: float, years_to_retire: int, retire
 def emergency_fund(monthly_expense: float, months: int = 6) -> float:
     return monthly_expense * months
 
+# ----------------------------- Cashflows & XIRR -----------------------------
+
+def future_value_step_up_sip(monthly: float, annual_return_pct: float, years: float,
+                             step_up_pct: float = 0.0) -> float:
+    """
+    Future value of a SIP raised by `step_up_pct` every 12 months (same
+    start-of-month convention as future_value_sip). Closed form: a geometric
+    series over years of 12-month annuities.
+    """
+    r = annual_return_pct / 100.0 / 12.0
+    s = step_up_pct / 100.0
+    n = int(round(years * 12))
+    full_years, rest = divmod(n, 12)
+
+    def annuity(k: int) -> float:  # value after k months of 1/month, paid at month starts
+        return float(k) if r == 0 else ((1 + r) ** k - 1) / r * (1 + r)
+
+    g = (1 + r) ** 12
+    q = 1 + s
+    if abs(g - q) < 1e-15:
+        series = full_years * g ** (full_years - 1) if full_years else 0.0
+    else:
+        series = (g ** full_years - q ** full_years) / (g - q)
+    fv_full = monthly * annuity(12) * series * (1 + r) ** rest
+    return fv_full + monthly * q ** full_years * annuity(rest)
+
+
+@dataclass
+class Cashflows:
+    """
+    Monthly cashflow series in compact parallel columns: month index (0 = now)
+    and amount invested (+) or withdrawn (-) at the start of that month.
+    """
+    months: array = field(default_factory=lambda: array('l'))
+    amounts: array = field(default_factory=lambda: array('d'))
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def add(self, month: int, amount: float) -> "Cashflows":
+        self.months.append(int(month))
+        self.amounts.append(float(amount))
+        return self
+
+    def add_lumpsum(self, month: int, amount: float) -> "Cashflows":
+        return self.add(month, amount)
+
+    def add_withdrawal(self, month: int, amount: float) -> "Cashflows":
+        return self.add(month, -abs(amount))
+
+    def add_sip(self, monthly: float, years: float, step_up_pct: float = 0.0,
+                start_month: int = 0) -> "Cashflows":
+        n = int(round(years * 12))
+        q = 1 + step_up_pct / 100.0
+        self.months.extend(range(start_month, start_month + n))
+        self.amounts.extend(monthly * q ** (k // 12) for k in range(n))
+        return self
+
+    @property
+    def horizon(self) -> int:
+        """Months from now until one month after the last flow."""
+        return max(self.months) + 1 if self.months else 0
+
+    def future_value(self, annual_return_pct: float, horizon_months: Optional[int] = None) -> float:
+        """Value of all flows compounded monthly to `horizon_months` (default: self.horizon)."""
+        r = annual_return_pct / 100.0 / 12.0
+        h = self.horizon if horizon_months is None else horizon_months
+        if np is not None and len(self) > 64:
+            months = np.frombuffer(self.months, dtype=np.dtype('l'))
+            amounts = np.frombuffer(self.amounts, dtype=float)
+            return float(np.dot(amounts, (1 + r) ** (h - months)))
+        return math.fsum(a * (1 + r) ** (h - m) for m, a in zip(self.months, self.amounts))
+
+    def xirr(self, final_value: float, horizon_months: Optional[int] = None) -> float:
+        """Annualized return given the portfolio is worth `final_value` at the horizon."""
+        h = self.horizon if horizon_months is None else horizon_months
+        amounts = [-a for a in self.amounts] + [final_value]
+        times = [m / 12.0 for m in self.months] + [h / 12.0]
+        return xirr(amounts, times)
+
+
+def _year_offsets(when) -> List[float]:
+    """Accept dates/datetimes (ACT/365 from the first) or year offsets as floats."""
+    when = list(when)
+    if when and hasattr(when[0], "toordinal"):
+        d0 = when[0].toordinal()
+        return [(d.toordinal() - d0) / 365.0 for d in when]
+    return [float(t) for t in when]
+
+
+def _npv(rate: float, amounts, times) -> Tuple[float, float]:
+    """Net present value and its derivative with respect to the rate."""
+    v = dv = 0.0
+    for a, t in zip(amounts, times):
+        d = (1 + rate) ** -t
+        v += a * d
+        dv -= t * a * d / (1 + rate)
+    return v, dv
+
+
+XIRR_LO, XIRR_HI = -0.9999, 1000.0  # bracket searched when Newton fails
+
+
+def xirr(amounts, when, guess: float = 0.1, tol: float = 1e-10, max_iter: int = 50) -> float:
+    """
+    Internal rate of return for irregular cashflows (negative = money in,
+    positive = money out). `when` holds dates or year offsets. Newton's method,
+    falling back to bisection over [XIRR_LO, XIRR_HI] if it diverges.
+    """
+    amounts = [float(a) for a in amounts]
+    times = _year_offsets(when)
+    if not (any(a > 0 for a in amounts) and any(a < 0 for a in amounts)):
+        raise ValueError("xirr needs at least one positive and one negative cashflow")
+
+    x = guess
+    for _ in range(max_iter):
+        v, dv = _npv(x, amounts, times)
+        if dv == 0 or not math.isfinite(v):
+            break
+        step = v / dv
+        x -= step
+        if x <= -1 or not math.isfinite(x):
+            break
+        if abs(step) < tol * max(1.0, abs(x)):
+            return x
+
+    lo, hi = XIRR_LO, XIRR_HI
+    v_lo = _npv(lo, amounts, times)[0]
+    if (v_lo > 0) == (_npv(hi, amounts, times)[0] > 0):
+        raise ValueError("xirr: no rate in range makes NPV zero")
+    for _ in range(200):
+        mid = (lo + hi) / 2
+        v_mid = _npv(mid, amounts, times)[0]
+        if (v_mid > 0) == (v_lo > 0):
+            lo, v_lo = mid, v_mid
+        else:
+            hi = mid
+        if hi - lo < tol:
+            break
+    return (lo + hi) / 2
+
+
+def xirr_many(amounts, times, guess: float = 0.1, tol: float = 1e-10, max_iter: int = 50) -> "np.ndarray":
+    """
+    XIRR for many series at once. `amounts` and `times` (years) are
+    (series x flows) arrays; pad short series with zero amounts. Newton runs on
+    all rows together; rows that fail are bisected together. Rows without a
+    sign change give NaN.
+    """
+    _require_numpy("xirr_many")
+    a = np.atleast_2d(np.asarray(amounts, dtype=float))
+    t = np.broadcast_to(np.atleast_2d(np.asarray(times, dtype=float)), a.shape)
+
+    def npv(x):
+        d = (1 + x)[:, None] ** -t
+        return (a * d).sum(axis=1), (-t * a * d).sum(axis=1) / (1 + x)
+
+    valid = (a > 0).any(axis=1) & (a < 0).any(axis=1)
+    x = np.full(a.shape[0], guess)
+    done = ~valid
+    failed = np.zeros_like(done)
+    with np.errstate(all="ignore"):
+        for _ in range(max_iter):
+            live = ~(done | failed)
+            if not live.any():
+                break
+            v, dv = npv(x)
+            step = np.where(live, v / dv, 0.0)
+            x = np.where(live, x - step, x)
+            failed |= live & ((x <= -1) | ~np.isfinite(x))
+            done |= live & ~failed & (np.abs(step) < tol * np.maximum(1.0, np.abs(x)))
+        failed |= ~done
+
+        # Bisection for rows Newton could not settle
+        lo = np.full(a.shape[0], XIRR_LO)
+        hi = np.full(a.shape[0], XIRR_HI)
+        v_lo, v_hi = npv(lo)[0], npv(hi)[0]
+        bracketed = failed & ((v_lo > 0) != (v_hi > 0))
+        if bracketed.any():
+            for _ in range(200):
+                mid = (lo + hi) / 2
+                v_mid = npv(mid)[0]
+                same = (v_mid > 0) == (v_lo > 0)
+                lo = np.where(same, mid, lo)
+                v_lo = np.where(same, v_mid, v_lo)
+                hi = np.where(same, hi, mid)
+                if (hi - lo)[bracketed].max() < tol:
+                    break
+        x = np.where(bracketed, (lo + hi) / 2, x)
+    return np.where(valid & (done | bracketed), x, np.nan)
+
+
+def xirr_portfolio(series: List[Cashflows], final_values, horizon_months=None) -> "np.ndarray":
+    """Cashflows.xirr for a whole portfolio of series in one xirr_many call."""
+    _require_numpy("xirr_portfolio")
+    final_values = np.broadcast_to(np.asarray(final_values, dtype=float), (len(series),))
+    horizons = [cf.horizon if horizon_months is None else horizon_months for cf in series]
+    width = max((len(cf) for cf in series), default=0) + 1
+    amounts = np.zeros((len(series), width))
+    times = np.zeros((len(series), width))
+    for i, cf in enumerate(series):
+        k = len(cf)
+        amounts[i, :k] = -np.frombuffer(cf.amounts, dtype=float)
+        times[i, :k] = np.frombuffer(cf.months, dtype=np.dtype('l')) / 12.0
+        amounts[i, k] = final_values[i]
+        times[i, k] = horizons[i] / 12.0
+    return xirr_many(amounts, times)
+
 # ----------------------------- Portfolio Suggestion -----------------------------
 
 RISK_ALLOCATION = {
@@ -263,215 +2004,1273 @@ def suggest_allocation(risk: str, horizon_years: int) -> Dict[str, float]:
         base[k] = round(base[k] / s, 2)
     return base
 
-# ----------------------------- Chat UX -----------------------------
+# ----------------------------- Monte Carlo Retirement -----------------------------
+
+# Nominal annual (mean, volatility) per asset class; draws are independent normals
+ASSET_ASSUMPTIONS = {
+    "equity": (0.12, 0.18),
+    "debt":   (0.07, 0.04),
+    "gold":   (0.08, 0.15),
+}
+
+
+@dataclass
+class MonteCarloResult:
+    paths: int
+    success_probability: float             # share of paths that never run out of money
+    corpus_percentiles: Dict[int, float]   # corpus at retirement
+    terminal_percentiles: Dict[int, float]  # corpus left after the last retired year
 
-HELP_TEXT = (
+
+def _mc_portfolio_returns(rng, weights: Dict[str, float], shape: Tuple[int, int]):
+    out = np.zeros(shape)
+    for asset, w in weights.items():
+        mu, sigma = ASSET_ASSUMPTIONS[asset]
+        out += w * rng.normal(mu, sigma, shape)
+    return out
+
+
+def _mc_chunk(args) -> Tuple[int, "np.ndarray", "np.ndarray"]:
+    """Simulate one chunk of paths; returns (successes, corpus at retirement, terminal corpus)."""
+    (seed, n, corpus0, monthly_sip, expense_today, years_to_retire, retired_years,
+     w_acc, w_ret, inflation, inflation_vol) = args
+    rng = np.random.default_rng(seed)
+    years = years_to_retire + retired_years
+    acc_returns = _mc_portfolio_returns(rng, w_acc, (n, years_to_retire))
+    ret_returns = _mc_portfolio_returns(rng, w_ret, (n, retired_years))
+    price_level = np.cumprod(1 + rng.normal(inflation, inflation_vol, (n, years)), axis=1)
+
+    # Accumulation: contribute at the start of each year, then grow
+    corpus = np.full(n, float(corpus0))
+    for y in range(years_to_retire):
+        corpus = (corpus + 12 * monthly_sip) * (1 + acc_returns[:, y])
+    at_retirement = corpus.copy()
+
+    # Drawdown: withdraw the year's inflated expenses up front, then grow what is left
+    alive = np.ones(n, dtype=bool)
+    for y in range(retired_years):
+        level = price_level[:, years_to_retire + y - 1] if years_to_retire + y else np.ones(n)
+        corpus = corpus - 12 * expense_today * level
+        alive &= corpus >= 0
+        corpus = np.maximum(corpus, 0.0) * (1 + ret_returns[:, y])
+    return int(alive.sum()), at_retirement, corpus
+
+
+def simulate_retirement(monthly_expense_today: float,
+                        years_to_retire: int,
+                        retired_years: int,
+                        current_corpus: float = 0.0,
+                        monthly_sip: float = 0.0,
+                        risk: str = "moderate",
+                        inflation_pct: float = 6.0,
+                        inflation_vol_pct: float = 1.5,
+                        paths: int = 10000,
+                        seed: Optional[int] = None,
+                        workers: int = 1,
+                        chunk_size: int = 50000,
+                        percentiles: Tuple[int, ...] = (5, 10, 25, 50, 75, 90, 95)) -> MonteCarloResult:
     """
-What I can do:
- 1) tax           -> Estimate income tax (India, Old vs New)
- 2) sip           -> SIP calculator (future value or required monthly)
- 3) goal          -> Plan a goal (target amount, return, years)
- 4) retirement    -> Retirement corpus estimate
- 5) emergency     -> Emergency fund target
- 6) emi           -> Loan EMI calculator
- 7) allocate      -> Suggested asset allocation
- 8) profile       -> View or update your profile
- 9) help          -> Show this help
-10) quit/exit     -> Save & exit
+    Monte Carlo success probability of a retirement plan. Accumulation uses
+    suggest_allocation(risk, years_to_retire) weights, drawdown uses
+    suggest_allocation(risk, retired_years). Paths are simulated in chunks of
+    `chunk_size` (spread over `workers` processes when > 1); each chunk gets its
+    own child of `seed`, so results do not depend on the worker count.
+    """
+    _require_numpy("simulate_retirement")
+    w_acc = suggest_allocation(risk, years_to_retire)
+    w_ret = suggest_allocation(risk, retired_years)
+    sizes = [min(chunk_size, paths - start) for start in range(0, paths, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(s, n, current_corpus, monthly_sip, monthly_expense_today, years_to_retire, retired_years,
+             w_acc, w_ret, inflation_pct / 100.0, inflation_vol_pct / 100.0) for s, n in zip(seeds, sizes)]
 
-Tip: You can also just type things like \"tax for 18 lakh new regime\" or
-\"need ₹50L in 15 yrs at 12% – how much SIP?\" and I'll try to parse it.
-"""
-).strip()
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunks = list(pool.map(_mc_chunk, jobs))
+    else:
+        chunks = [_mc_chunk(job) for job in jobs]
 
+    successes = sum(c[0] for c in chunks)
+    at_retirement = np.concatenate([c[1] for c in chunks]) if chunks else np.zeros(0)
+    terminal = np.concatenate([c[2] for c in chunks]) if chunks else np.zeros(0)
+    pct = list(percentiles)
+    return MonteCarloResult(
+        paths=paths,
+        success_probability=successes / paths if paths else 0.0,
+        corpus_percentiles=dict(zip(pct, np.percentile(at_retirement, pct).tolist())) if paths else {},
+        terminal_percentiles=dict(zip(pct, np.percentile(terminal, pct).tolist())) if paths else {},
+    )
 
-class Chatbot:
-    def __init__(self):
-        self.profile = load_profile()
-        self.tax_calc = IndiaTaxCalculator()
+# ----------------------------- Scenario Sweeps -----------------------------
+
+SWEEP_DEFAULTS = {
+    "age": 30,
+    "retire_age": 60,
+    "retired_years": 25,
+    "monthly_expense": 50000.0,
+    "inflation_pct": 6.0,
+    "swr_pct": 3.5,
+    "return_pct": 12.0,
+    "risk": "moderate",
+}
+SWEEP_RESULTS = ("years_to_retire", "future_monthly_expense", "corpus", "required_sip", "equity", "debt", "gold")
+SWEEP_COLUMNS = tuple(SWEEP_DEFAULTS) + SWEEP_RESULTS
 
-    # ------------------- Command Handlers -------------------
-    def cmd_help(self, _: List[str]):
-        print(HELP_TEXT)
 
-    def cmd_profile(self, args: List[str]):
-        p = self.profile
-        print("\nCurrent profile:")
-        print(json.dumps(asdict(p), indent=2))
-        print("\nUpdate fields (press Enter to keep current):")
-        try:
-            name = input(f"Name [{p.name}]: ").strip() or p.name
-            age = input(f"Age [{p.age or ''}]: ").strip()
-            income = input(f"Monthly income ₹ [{p.monthly_income or ''}]: ").strip()
-            expenses = input(f"Monthly expenses ₹ [{p.monthly_expenses or ''}]: ").strip()
-            emergency_months = input(f"Emergency months [{p.emergency_months}]: ").strip()
-            risk = input(f"Risk (conservative/moderate/aggressive) [{p.risk}]: ").strip() or p.risk
-            city = input(f"City [{p.city or ''}]: ").strip() or p.city
-            regime = input(f"Tax regime preference (new/old) [{p.regime_preference or ''}]: ").strip() or p.regime_preference
-
-            p.name = name
-            p.age = int(age) if age else p.age
-            p.monthly_income = float(income) if income else p.monthly_income
-            p.monthly_expenses = float(expenses) if expenses else p.monthly_expenses
-            p.emergency_months = int(emergency_months) if emergency_months else p.emergency_months
-            p.risk = risk.lower()
-            p.city = city
-            p.regime_preference = regime.lower() if regime else p.regime_preference
-            save_profile(p)
-            print("\nSaved ✔\n")
-        except KeyboardInterrupt:
-            print("\nUpdate cancelled.")
-        except Exception as e:
-            print(f"[error] {e}")
+def _sweep_chunk(rows: List[tuple]) -> List[tuple]:
+    """Evaluate one chunk of parameter tuples (ordered as SWEEP_DEFAULTS)."""
+    out = []
+    for row in rows:
+        age, retire_age, retired_years, expense, inflation, swr, ret, risk = row
+        years = retire_age - age
+        if years <= 0:
+            out.append(row + (years,) + (None,) * (len(SWEEP_RESULTS) - 1))
+            continue
+        corpus, future_monthly = retirement_target(expense, years, retired_years, inflation, swr)
+        alloc = suggest_allocation(risk, years)
+        out.append(row + (years, future_monthly, corpus, required_sip(corpus, ret, years),
+                          alloc["equity"], alloc["debt"], alloc["gold"]))
+    return out
 
-    def cmd_emergency(self, args: List[str]):
-        p = self.profile
-        if p.monthly_expenses is None:
-            try:
-                mexp = float(input("Monthly expenses ₹: "))
-            except Exception:
-                print("Please enter a number.")
-                return
-        else:
-            mexp = p.monthly_expenses
-        months = p.emergency_months
+
+def _sweep_schema(pa):
+    """Parquet schema for SWEEP_COLUMNS, fixed up front so every chunk matches."""
+    types = {int: pa.int64(), str: pa.string()}
+    fields = [(k, types.get(type(v), pa.float64())) for k, v in SWEEP_DEFAULTS.items()]
+    fields.append(("years_to_retire", pa.int64()))
+    fields += [(k, pa.float64()) for k in SWEEP_RESULTS[1:]]
+    return pa.schema(fields)
+
+
+def _imap_bounded(pool, fn, chunks, max_pending: int, ordered: bool = False):
+    """
+    Map `fn` over an iterator of chunks with at most `max_pending` in flight, so
+    neither inputs nor results pile up in memory. Yields results as they
+    complete, or in submission order if `ordered`.
+    """
+    chunks = iter(chunks)
+    pending = deque()
+    while True:
+        while len(pending) < max_pending:
+            chunk = next(chunks, None)
+            if chunk is None:
+                break
+            pending.append(pool.submit(fn, chunk))
+        if not pending:
+            return
+        if ordered:
+            yield pending.popleft().result()
+            continue
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            pending.remove(fut)
+            yield fut.result()
+
+
+def iter_sweep(grid: Dict[str, List], chunk_size: int = 2000, workers: Optional[int] = None) -> Iterator[List[tuple]]:
+    """
+    Evaluate retirement_target / required_sip / suggest_allocation over the cartesian
+    product of `grid` (keys from SWEEP_DEFAULTS; missing keys use the default).
+    Yields chunks of rows (ordered as SWEEP_COLUMNS) as workers finish them;
+    chunk order is not preserved when workers > 1.
+    """
+    unknown = set(grid) - set(SWEEP_DEFAULTS)
+    if unknown:
+        raise ValueError(f"unknown sweep parameters: {', '.join(sorted(unknown))}")
+    axes = [list(grid.get(k, [v])) for k, v in SWEEP_DEFAULTS.items()]
+    combos = itertools.product(*axes)
+    chunks = iter(lambda: list(itertools.islice(combos, chunk_size)), [])
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        yield from map(_sweep_chunk, chunks)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from _imap_bounded(pool, _sweep_chunk, chunks, max_pending=2 * workers)
+
+
+def run_sweep(grid: Dict[str, List], out_path: str, chunk_size: int = 2000,
+              workers: Optional[int] = None, fmt: Optional[str] = None) -> int:
+    """
+    Stream a sweep to CSV or Parquet (by extension, or `fmt`), one chunk at a
+    time. Parquet needs pyarrow. Returns the number of rows written.
+    """
+    fmt = fmt or ("parquet" if out_path.endswith((".parquet", ".pq")) else "csv")
+    rows = 0
+    if fmt == "csv":
+        with open(out_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(SWEEP_COLUMNS)
+            for chunk in iter_sweep(grid, chunk_size, workers):
+                writer.writerows(chunk)
+                rows += len(chunk)
+    elif fmt == "parquet":
         try:
-            s = input(f"Months of buffer [{months}]: ").strip()
-            if s:
-                months = int(s)
-        except Exception:
-            pass
-        target = emergency_fund(mexp, months)
-        print(f"Emergency fund target for {months} months: {currency(target)}")
-
-    def cmd_sip(self, args: List[str]):
-        print("SIP calculator → Choose mode:")
-        print(" 1) Future value (given monthly SIP)")
-        print(" 2) Required SIP (given target)")
-        choice = input("Enter 1 or 2: ").strip()
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow (pip install pyarrow)") from None
+        schema = _sweep_schema(pa)
+        writer = pq.ParquetWriter(out_path, schema)
         try:
-            if choice == '1':
-                monthly = float(input("Monthly SIP ₹: "))
-                rate = float(input("Expected annual return %: "))
-                years = float(input("Years: "))
-                fv = future_value_sip(monthly, rate, years)
-                print(f"Future value ≈ {currency(fv)}")
-            elif choice == '2':
-                target = float(input("Target amount ₹: "))
-                rate = float(input("Expected annual return %: "))
-                years = float(input("Years: "))
-                sip_amt = required_sip(target, rate, years)
-                print(f"Required monthly SIP ≈ {currency(sip_amt)}")
-            else:
-                print("Invalid choice.")
-        except Exception:
-            print("Please enter valid numbers.")
+            for chunk in iter_sweep(grid, chunk_size, workers):
+                writer.write_table(pa.Table.from_pylist([dict(zip(SWEEP_COLUMNS, r)) for r in chunk], schema=schema))
+                rows += len(chunk)
+        finally:
+            writer.close()
+    else:
+        raise ValueError(f"unknown output format: {fmt!r}")
+    return rows
+
+# ----------------------------- Headless Engine -----------------------------
+
+@dataclass
+class Response:
+    """Result of one engine command: display lines plus structured data."""
+    lines: List[str]
+    data: Dict[str, object] = field(default_factory=dict)
+    ok: bool = True
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+
+@dataclass
+class TaxRequest:
+    income: float
+    salaried: bool = True
+    regime: str = "new"
+    d80c: float = 0.0
+    d80d: float = 0.0
+    fy: Optional[str] = None  # financial year in TAX_RULES; None = the engine's calculator
+
+
+@dataclass
+class SipRequest:
+    mode: str       # "fv": future value of `amount` per month; "required": SIP to reach target `amount`
+    amount: float
+    rate: float
+    years: float
+
+
+@dataclass
+class GoalRequest:
+    target: float
+    years: float
+    rate: float
+
+
+@dataclass
+class EmiRequest:
+    principal: float
+    rate: float
+    years: float
+
+
+@dataclass
+class RetirementRequest:
+    age: int
+    retire_age: int
+    monthly_expense: float
+    inflation: float = 6.0
+    swr: float = 3.5
+    accumulation_return: Optional[float] = None  # omit to get only the corpus
+
+
+@dataclass
+class EmergencyRequest:
+    monthly_expense: float
+    months: int = 6
+
+
+@dataclass
+class AllocateRequest:
+    risk: str
+    horizon: int
+
+
+@dataclass
+class ProfileRequest:
+    profile: UserProfile
+    updates: Dict[str, str]  # raw field text as typed; empty keeps the current value
+
+
+REQUEST_TYPES = {
+    "tax": TaxRequest,
+    "sip": SipRequest,
+    "goal": GoalRequest,
+    "emi": EmiRequest,
+    "retirement": RetirementRequest,
+    "emergency": EmergencyRequest,
+    "allocate": AllocateRequest,
+    "profile": ProfileRequest,
+}
 
-    def cmd_goal(self, args: List[str]):
+
+def _as_bool(v) -> bool:
+    if isinstance(v, str):
+        return v.strip().lower() in ("y", "yes", "true", "1")
+    return bool(v)
+
+
+_COERCE = {
+    "float": float,
+    "int": int,
+    "bool": _as_bool,
+    "str": str,
+    "Optional[float]": lambda v: None if v is None else float(v),
+    "Optional[str]": lambda v: None if v is None else str(v),
+    "UserProfile": lambda v: v if isinstance(v, UserProfile) else profile_from_dict(v),
+    "Dict[str, str]": lambda v: {str(k): str(x) for k, x in dict(v).items()},
+}
+
+
+def request_from_dict(command: str, payload: dict):
+    """Build the request for `command` from JSON-like data; ValueError on bad input."""
+    cls = REQUEST_TYPES.get(command)
+    if cls is None:
+        raise ValueError(f"unknown command: {command!r}")
+    known = {f.name: f for f in fields(cls)}
+    unknown = payload.keys() - known.keys()
+    if unknown:
+        raise ValueError(f"unknown fields for {command}: {', '.join(sorted(unknown))}")
+    try:
+        return cls(**{k: _COERCE[str(known[k].type)](v) for k, v in payload.items()})
+    except TypeError as e:  # missing required fields
+        raise ValueError(str(e)) from None
+
+
+class PlannerEngine:
+    """
+    Stateless command layer: each method takes a request and returns a Response,
+    with no input()/print(). Chatbot, the HTTP service and chat sessions sit on top.
+    """
+    def __init__(self, tax_calc: Optional[IndiaTaxCalculator] = None):
+        self.tax_calc = tax_calc or IndiaTaxCalculator()
+        self._handlers = {
+            TaxRequest: self.tax,
+            SipRequest: self.sip,
+            GoalRequest: self.goal,
+            EmiRequest: self.emi,
+            RetirementRequest: self.retirement,
+            EmergencyRequest: self.emergency,
+            AllocateRequest: self.allocate,
+            ProfileRequest: self.profile,
+        }
+
+    def handle(self, req) -> Response:
+        return self._handlers[type(req)](req)
+
+    def handle_dict(self, command: str, payload: dict) -> Response:
+        return self.handle(request_from_dict(command, payload))
+
+    def tax(self, req: TaxRequest) -> Response:
+        calc = self.tax_calc if req.fy is None else year_calculator(req.fy)
+        res = calc.estimate(req.income, req.salaried, req.regime, req.d80c, req.d80d)
+        lines = ["\n— Tax Estimate —",
+                 f"Regime: {'New' if res['regime']==1.0 else 'Old'}",
+                 f"Gross Income:      {currency(res['gross'])}"]
+        if res['std_deduction']:
+            lines.append(f"Std Deduction:     {currency(res['std_deduction'])}")
+        if res['deductions']:
+            lines.append(f"Other Deductions:  {currency(res['deductions'])}")
+        lines.append(f"Taxable Income:    {currency(res['taxable'])}")
+        lines.append(f"Base Tax:          {currency(res['base_tax'])}")
+        if res['rebate']:
+            lines.append(f"Rebate (87A):      -{currency(res['rebate'])}")
+        if res['surcharge']:
+            lines.append(f"Surcharge:         {currency(res['surcharge'])}")
+        if res['marginal_relief']:
+            lines.append(f"Marginal Relief:   -{currency(res['marginal_relief'])}")
+        lines.append(f"Cess (4%):         {currency(res['cess'])}")
+        lines.append(f"Total Tax:         {currency(res['total_tax'])}")
+        lines.append(f"Effective Rate:    {res['effective_rate']*100:.2f}%\n")
+        return Response(lines, res)
+
+    def sip(self, req: SipRequest) -> Response:
+        if req.mode == "fv":
+            fv = future_value_sip(req.amount, req.rate, req.years)
+            return Response([f"Future value ≈ {currency(fv)}"], {"future_value": fv})
+        if req.mode == "required":
+            sip_amt = required_sip(req.amount, req.rate, req.years)
+            return Response([f"Required monthly SIP ≈ {currency(sip_amt)}"], {"monthly_sip": sip_amt})
+        return Response(["Invalid choice."], ok=False)
+
+    def goal(self, req: GoalRequest) -> Response:
+        sip_amt = required_sip(req.target, req.rate, req.years)
+        return Response([f"To reach {currency(req.target)} in {req.years:.1f} years at {req.rate:.2f}% p.a., "
+                         f"invest ≈ {currency(sip_amt)} per month."], {"monthly_sip": sip_amt})
+
+    def emi(self, req: EmiRequest) -> Response:
+        m = emi(req.principal, req.rate, req.years)
+        total = m * int(round(req.years * 12))
+        interest = total - req.principal
+        return Response([f"EMI ≈ {currency(m)} | Total Interest ≈ {currency(interest)} | Total Paid ≈ {currency(total)}"],
+                        {"emi": m, "total_interest": interest, "total_paid": total})
+
+    @staticmethod
+    def check_retirement_ages(age: int, retire_age: int) -> Optional[Response]:
+        if retire_age - age <= 0:
+            return Response(["Retirement age must be greater than current age."], ok=False)
+        return None
+
+    def retirement(self, req: RetirementRequest) -> Response:
+        error = self.check_retirement_ages(req.age, req.retire_age)
+        if error:
+            return error
+        years_to_retire = req.retire_age - req.age
+        corpus, future_monthly = retirement_target(req.monthly_expense, years_to_retire, retired_years=25,
+                                                   inflation_pct=req.inflation, swr_pct=req.swr)
+        lines = [f"At {req.inflation:.1f}% inflation, your monthly expense at retirement ≈ {currency(future_monthly)}",
+                 f"Estimated retirement corpus needed (SWR {req.swr:.2f}%) ≈ {currency(corpus)}"]
+        data = {"years_to_retire": years_to_retire, "corpus": corpus, "future_monthly_expense": future_monthly}
+        if req.accumulation_return is not None:
+            rate = req.accumulation_return
+            sip_amt = required_sip(corpus, rate, years_to_retire)
+            lines.append(f"Suggested monthly investment ≈ {currency(sip_amt)} for {years_to_retire} years at {rate:.1f}% p.a.")
+            data["monthly_sip"] = sip_amt
+        return Response(lines, data)
+
+    def emergency(self, req: EmergencyRequest) -> Response:
+        target = emergency_fund(req.monthly_expense, req.months)
+        return Response([f"Emergency fund target for {req.months} months: {currency(target)}"], {"target": target})
+
+    def allocate(self, req: AllocateRequest) -> Response:
+        allocation = suggest_allocation(req.risk, req.horizon)
+        lines = ["Suggested allocation:"]
+        lines += [f"  {k.capitalize():8s}: {int(v*100)}%" for k, v in allocation.items()]
+        return Response(lines, dict(allocation))
+
+    def profile(self, req: ProfileRequest) -> Response:
+        """Apply typed-in updates; returns the new profile in data["profile"] (the caller persists it)."""
+        p, u = req.profile, {k: v.strip() for k, v in req.updates.items()}
+        regime = u.get("regime_preference") or p.regime_preference
+        updated = replace(
+            p,
+            name=u.get("name") or p.name,
+            age=int(u["age"]) if u.get("age") else p.age,
+            monthly_income=float(u["monthly_income"]) if u.get("monthly_income") else p.monthly_income,
+            monthly_expenses=float(u["monthly_expenses"]) if u.get("monthly_expenses") else p.monthly_expenses,
+            emergency_months=int(u["emergency_months"]) if u.get("emergency_months") else p.emergency_months,
+            risk=(u.get("risk") or p.risk).lower(),
+            city=u.get("city") or p.city,
+            regime_preference=regime.lower() if regime else p.regime_preference,
+        )
+        return Response(["\nUpdated ✔ (not saved; persist data[\"profile\"] to keep it)\n"], {"profile": updated})
+
+# ----------------------------- HTTP Service -----------------------------
+
+def _json_dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_json_default)
+    return json.dumps(obj, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _json_default(obj):
+    if isinstance(obj, UserProfile):
+        return profile_to_dict(obj)
+    if np is not None and isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def _json_loads(raw: bytes):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw or b"null")
+
+
+def _batch_tax(payload: dict) -> Dict[str, list]:
+    """Worker-side body of POST /batch/tax: columns in, columns out."""
+    calc = year_calculator(payload["fy"]) if payload.get("fy") else IndiaTaxCalculator()
+    salaried = payload.get("salaried", True)
+    salaried = [_as_bool(v) for v in salaried] if isinstance(salaried, list) else _as_bool(salaried)
+    args = (payload["income"], salaried, payload.get("regime", "new"),
+            payload.get("d80c", 0.0), payload.get("d80d", 0.0))
+    if np is not None:
+        return {k: v.tolist() for k, v in calc.estimate_many(*args).items()}
+    n = len(args[0])
+    cols = [a if isinstance(a, list) else [a] * n for a in args]
+    rows = [calc.estimate(*row) for row in zip(*cols)]
+    return {k: [r[k] for r in rows] for k in rows[0]} if rows else {}
+
+
+def _batch_sip(payload: dict) -> Dict[str, list]:
+    """Worker-side body of POST /batch/sip: broadcast grids of future value or required SIP."""
+    _require_numpy("/batch/sip")
+    rate, years = payload["rate"], payload["years"]
+    if payload.get("mode", "fv") == "required":
+        return {"monthly_sip": required_sip_many(payload["target"], rate, years).tolist()}
+    return {"future_value": future_value_sip_many(payload["monthly"], rate, years).tolist()}
+
+
+class PlannerService:
+    """
+    HTTP/1.1 JSON front end for PlannerEngine on asyncio streams (stdlib only).
+
+      POST /<command>   body = request fields (see REQUEST_TYPES), e.g. POST /tax {"income": 1800000}
+      POST /batch/tax   body = {"income": [...], "regime": [...], ...} -> one list per estimate() key
+      POST /batch/sip   body = {"monthly"|"target": ..., "rate": ..., "years": ..., "mode": "fv"|"required"}
+      POST /chat        body = {"session": "<id>", "text": "..."} -> {"lines": [...], "waiting": bool}
+      GET  /health
+
+    Connections are kept alive and pipelined requests are answered in order.
+    Single calculations run inline (they take microseconds); batch endpoints run
+    in a process pool so the event loop never blocks on them.
+    """
+    BATCH_HANDLERS = {"/batch/tax": _batch_tax, "/batch/sip": _batch_sip}
+    REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error", 501: "Not Implemented"}
+
+    def __init__(self, engine: Optional[PlannerEngine] = None, workers: Optional[int] = None,
+                 max_body: int = 16 * 1024 * 1024, sessions: Optional["SessionManager"] = None):
+        self.engine = engine or PlannerEngine()
+        self.workers = workers
+        self.max_body = max_body
+        self.sessions = sessions or SessionManager(self.engine)
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8080) -> None:
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        evictor = asyncio.create_task(self.sessions.run_evictor())
         try:
-            target = float(input("Target amount ₹: "))
-            years = float(input("Years to goal: "))
-            rate = float(input("Expected annual return %: "))
-            sip_amt = required_sip(target, rate, years)
-            print(f"To reach {currency(target)} in {years:.1f} years at {rate:.2f}% p.a., invest ≈ {currency(sip_amt)} per month.")
-        except Exception:
-            print("Please enter valid numbers.")
+            server = await asyncio.start_server(self._serve_connection, host, port, reuse_address=True)
+            print(f"Serving on http://{host}:{port}", file=sys.stderr)
+            async with server:
+                await server.serve_forever()
+        finally:
+            evictor.cancel()
+            self._pool.shutdown(cancel_futures=True)
 
-    def cmd_emi(self, args: List[str]):
+    async def _serve_connection(self, reader, writer) -> None:
         try:
-            principal = float(input("Loan principal ₹: "))
-            rate = float(input("Annual interest %: "))
-            years = float(input("Tenure (years): "))
-            m = emi(principal, rate, years)
-            total = m * int(round(years * 12))
-            interest = total - principal
-            print(f"EMI ≈ {currency(m)} | Total Interest ≈ {currency(interest)} | Total Paid ≈ {currency(total)}")
-        except Exception:
-            print("Please enter valid numbers.")
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    writer.write(self._response(400, {"error": "request head too large"}, False))
+                    break
+                method, path, version, headers = self._parse_head(head)
+                keep_alive = (headers.get("connection", "").lower() != "close" if version == "HTTP/1.1"
+                              else headers.get("connection", "").lower() == "keep-alive")
+                if "chunked" in headers.get("transfer-encoding", "").lower():
+                    writer.write(self._response(501, {"error": "chunked bodies are not supported"}, False))
+                    break
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    writer.write(self._response(400, {"error": "invalid Content-Length"}, False))
+                    break
+                if length > self.max_body:
+                    writer.write(self._response(413, {"error": "body too large"}, False))
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self._dispatch(method, path, body)
+                writer.write(self._response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
 
-    def cmd_retirement(self, args: List[str]):
+    @staticmethod
+    def _parse_head(head: bytes):
+        lines = head.decode("latin-1").split("\r\n")
         try:
-            age = self.profile.age or int(input("Your age: "))
-            retire_age = int(input("Retirement age (e.g., 60): "))
-            years_to_retire = retire_age - age
-            if years_to_retire <= 0:
-                print("Retirement age must be greater than current age.")
-                return
-            expense = self.profile.monthly_expenses or float(input("Monthly expense today ₹: "))
-            inflation = float(input("Inflation % (default 6): ") or 6.0)
-            swr = float(input("Safe withdrawal rate % (default 3.5): ") or 3.5)
-            corpus, future_monthly = retirement_target(expense, years_to_retire, retired_years=25, inflation_pct=inflation, swr_pct=swr)
-            print(f"At {inflation:.1f}% inflation, your monthly expense at retirement ≈ {currency(future_monthly)}")
-            print(f"Estimated retirement corpus needed (SWR {swr:.2f}%) ≈ {currency(corpus)}")
-            rate = float(input("Expected return during accumulation % (e.g., 12): ") or 12)
-            sip_amt = required_sip(corpus, rate, years_to_retire)
-            print(f"Suggested monthly investment ≈ {currency(sip_amt)} for {years_to_retire} years at {rate:.1f}% p.a.")
+            method, path, version = lines[0].split(" ", 2)
+        except ValueError:
+            return "", "", "HTTP/1.0", {}
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                k, v = line.split(":", 1)
+                headers[k.strip().lower()] = v.strip()
+        return method, path.split("?", 1)[0], version, headers
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, dict]:
+        if path == "/health":
+            return 200, {"status": "ok"}
+        command = path.strip("/")
+        if path not in self.BATCH_HANDLERS and command not in REQUEST_TYPES and path != "/chat":
+            return 404, {"error": f"no such endpoint: {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        try:
+            payload = _json_loads(body) if body else {}
+            if not isinstance(payload, dict):
+                raise ValueError("request body must be a JSON object")
+            if path in self.BATCH_HANDLERS:
+                loop = asyncio.get_running_loop()
+                data = await loop.run_in_executor(self._pool, self.BATCH_HANDLERS[path], payload)
+                return 200, {"ok": True, "data": data}
+            if path == "/chat":
+                return 200, self._chat(payload)
+            resp = self.engine.handle_dict(command, payload)
+            return 200, {"ok": resp.ok, "data": resp.data, "text": resp.text}
+        except (ValueError, KeyError, TypeError, ZeroDivisionError) as e:
+            return 400, {"error": str(e) or type(e).__name__}
         except Exception as e:
-            print(f"Please enter valid numbers. {e}")
+            return 500, {"error": str(e) or type(e).__name__}
+
+    def _chat(self, payload: dict) -> dict:
+        sid = payload.get("session") or os.urandom(8).hex()
+        if not isinstance(sid, str):
+            raise ValueError("session must be a string")
+        lines = self.sessions.feed(sid, str(payload.get("text", "")))
+        return {"ok": True, "session": sid, "lines": lines, "waiting": self.sessions.waiting(sid)}
+
+    def _response(self, status: int, payload: dict, keep_alive: bool) -> bytes:
+        body = _json_dumps(payload)
+        head = (f"HTTP/1.1 {status} {self.REASONS[status]}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        return head.encode("latin-1") + body
+
+# ----------------------------- Chat UX -----------------------------
+
+# ------------------- Command registry -------------------
 
-    def cmd_allocate(self, args: List[str]):
+@dataclass(frozen=True)
+class Command:
+    """
+    A chat command: its flow, the words that invoke it and its help line.
+    Commands with a `priority` are also picked out of freeform messages by
+    their name, aliases and `keywords` (lower priority wins when several match).
+    """
+    name: str
+    flow: Callable
+    help: str
+    aliases: Tuple[str, ...] = ()
+    label: str = ""
+    exits: bool = False
+    keywords: Tuple[str, ...] = ()
+    priority: Optional[int] = None
+
+
+class CommandRegistry:
+    """
+    Chat commands keyed by name and alias. Flows register with the `command`
+    decorator; a whole input line is looked up with one dict hit, and the help
+    menu is rendered in registration order.
+    """
+    def __init__(self):
+        self._commands: List[Command] = []
+        self._lookup: Dict[str, Command] = {}
+        self._router: Optional["IntentRouter"] = None
+
+    def command(self, name: str, *aliases: str, help: str, label: Optional[str] = None, exits: bool = False,
+                keywords: Tuple[str, ...] = (), priority: Optional[int] = None):
+        def register(flow):
+            cmd = Command(name, flow, help, aliases, label or name, exits, keywords, priority)
+            for word in (name,) + aliases:
+                if word in self._lookup:
+                    raise ValueError(f"command {word!r} is already registered")
+                self._lookup[word] = cmd
+            self._commands.append(cmd)
+            self._router = None
+            return flow
+        return register
+
+    def get(self, word: str) -> Optional[Command]:
+        """Command for an exact (lower-case) name or alias."""
+        return self._lookup.get(word)
+
+    def intents(self) -> Tuple[Tuple[str, Tuple[str, ...]], ...]:
+        """(name, words) for freeform routing, highest priority first; punctuation-only aliases are skipped."""
+        routed = sorted((c for c in self._commands if c.priority is not None), key=attrgetter("priority"))
+        return tuple((c.name, tuple(w for w in (c.name,) + c.aliases + c.keywords if re.search(r"\w", w)))
+                     for c in routed)
+
+    def route(self, text: str) -> Optional[Command]:
+        """The command a freeform message asks for, or None."""
+        if self._router is None:
+            self._router = IntentRouter(self.intents())
+        name = self._router.route(text)
+        return None if name is None else self._lookup[name]
+
+    def __iter__(self) -> Iterator[Command]:
+        return iter(self._commands)
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+    def help_text(self, tip: str = "") -> str:
+        lines = ["What I can do:"]
+        lines += [f"{i:>2}) {c.label:<13} -> {c.help}" for i, c in enumerate(self._commands, 1)]
+        if tip:
+            lines += ["", tip]
+        return "\n".join(lines)
+
+
+COMMANDS = CommandRegistry()
+HELP_TIP = """Tip: You can also just type things like \"tax for 18 lakh new regime\" or
+\"need ₹50L in 15 yrs at 12% – how much SIP?\" and I'll try to parse it."""
+
+
+# ------------------- Slot extraction -------------------
+
+_MULTIPLIERS = {"k": 1e3, "thousand": 1e3, "l": 1e5, "lakh": 1e5, "lakhs": 1e5, "lac": 1e5, "lacs": 1e5,
+                "cr": 1e7, "crore": 1e7, "crores": 1e7}
+
+_SLOT_PATTERN = re.compile(r"""
+    (?P<section>\b80\s*(?P<sec>[cd]))\b
+  | \b(?:i'?m|i\s+am|aged?)\s+(?P<age>\d{2})\b
+  | \bretire\w*\s+(?:at|by)\s+(?:age\s+)?(?P<retire_at>\d{2})\b
+  | (?:(?P<currency>₹|\brs\.?|\binr\b)\s*)?
+    (?<!\w)(?P<num>\d[\d,]*(?:\.\d+)?)\s*
+    (?: (?P<pct>%|\s*(?:percent|pc)\b)
+      | (?P<unit>years?|yrs?|y|months?|mos?)\b
+      | (?P<mult>thousand|lakhs?|lacs?|l|crores?|cr|k)\b
+    )?
+  | \b(?P<regime>new|old)(?:\s+tax)?\s+regime\b
+  | \bregime\s*[:=]?\s*(?P<regime_after>new|old)\b
+  | \b(?P<not_salaried>self[-\s]?employed|business|freelanc\w*|not\s+salaried|non[-\s]?salaried)\b
+  | \b(?P<salaried>salaried|salary)\b
+  | \b(?P<risk>conservative|moderate|aggressive)\b
+  | \b(?P<target>need|target|how\s+much|required|reach|corpus)\b
+""", re.IGNORECASE | re.VERBOSE)
+
+
+@dataclass(frozen=True)
+class Slots:
+    """Values parsed out of a freeform message (see extract_slots)."""
+    amounts: Tuple[float, ...] = ()
+    percents: Tuple[float, ...] = ()
+    years: Optional[float] = None
+    months: Optional[int] = None
+    regime: Optional[str] = None
+    salaried: Optional[bool] = None
+    risk: Optional[str] = None
+    age: Optional[int] = None
+    retire_age: Optional[int] = None
+    d80c: Optional[float] = None
+    d80d: Optional[float] = None
+    wants_target: bool = False
+
+    @property
+    def amount(self) -> Optional[float]:
+        return self.amounts[0] if self.amounts else None
+
+    @property
+    def rate(self) -> Optional[float]:
+        return self.percents[0] if self.percents else None
+
+    @property
+    def tenure_years(self) -> Optional[float]:
+        if self.years is not None:
+            return self.years
+        return self.months / 12 if self.months is not None else None
+
+
+NO_SLOTS = Slots()
+
+
+def extract_slots(text: str) -> Slots:
+    """
+    Pull amounts, percentages, durations and keywords out of `text` in one regex pass.
+
+      "tax for 18 lakh new regime"            -> amounts=(1800000.0,), regime="new"
+      "need ₹50L in 15 yrs at 12%"            -> amounts=(5000000.0,), years=15, percents=(12.0,), wants_target
+      "old regime 80c 1.5L 80d 25k, salaried" -> regime="old", d80c=150000.0, d80d=25000.0, salaried=True
+
+    Amounts take a ₹/Rs/INR prefix or a k/L/lakh/Cr/crore suffix; a bare number
+    counts as an amount from 1,000 up. An amount right after "80C"/"80D" fills
+    that deduction instead.
+    """
+    amounts: List[float] = []
+    percents: List[float] = []
+    found: dict = {}
+    section = None
+    for m in _SLOT_PATTERN.finditer(text):
+        kind = m.lastgroup
+        if m.group("num") is not None:
+            value = float(m.group("num").replace(",", ""))
+            if m.group("pct"):
+                percents.append(value)
+            elif m.group("unit"):
+                if m.group("unit").lower().startswith("m"):
+                    found.setdefault("months", int(value))
+                else:
+                    found.setdefault("years", value)
+            elif m.group("mult") or m.group("currency") or value >= 1000:
+                value *= _MULTIPLIERS.get((m.group("mult") or "").lower(), 1.0)
+                if section is not None:
+                    found.setdefault(section, value)
+                else:
+                    amounts.append(value)
+            section = None
+            continue
+        section = None
+        if m.group("section") is not None:
+            section = "d80" + m.group("sec").lower()
+        elif kind in ("regime", "regime_after"):
+            found.setdefault("regime", m.group(kind).lower())
+        elif kind in ("salaried", "not_salaried"):
+            found.setdefault("salaried", kind == "salaried")
+        elif kind == "risk":
+            found.setdefault("risk", m.group(kind).lower())
+        elif kind in ("age", "retire_at"):
+            found.setdefault("age" if kind == "age" else "retire_age", int(m.group(kind)))
+        elif kind == "target":
+            found["wants_target"] = True
+    if not (amounts or percents or found):
+        return NO_SLOTS
+    return Slots(amounts=tuple(amounts), percents=tuple(percents), **found)
+
+
+# ------------------- Conversation flows -------------------
+# Each command is a generator that yields (SAY, text) for output and
+# (ASK, prompt) for input; the answer comes back through send(). Values already
+# given in a freeform message arrive as Slots and their prompts are skipped.
+# Drivers: the REPL answers with input(), SessionManager parks the generator
+# between messages.
+
+SAY, ASK = "say", "ask"
+
+
+def _say_response(resp: Response):
+    for line in resp.lines:
+        yield SAY, line
+
+
+def _ask(prompt: str, value=None):
+    """The value parsed from the message for this prompt if there is one, else ask."""
+    if value is not None:
+        return value
+    return (yield ASK, prompt)
+
+
+def _yes_no(flag: Optional[bool]) -> Optional[str]:
+    return None if flag is None else ("y" if flag else "n")
+
+
+@COMMANDS.command("tax", help="Estimate income tax (India, Old vs New)", keywords=("taxes",), priority=1)
+def flow_tax(ctx, slots: Slots = NO_SLOTS):
+    try:
+        income = float((yield from _ask("Gross annual income ₹: ", slots.amount)))
+        salaried = slots.salaried
+        if salaried is None and slots.amount is not None and slots.regime is not None:
+            salaried = True  # "tax for 18 lakh new regime": take the [y] default rather than ask
+        answer = yield from _ask("Are you salaried? (y/n) [y]: ", _yes_no(salaried))
+        salaried = (answer.strip().lower() or 'y') == 'y'
+        regime_default = ctx.profile.regime_preference or 'new'
+        regime = (yield from _ask(f"Regime new/old [{regime_default}]: ", slots.regime)).strip().lower() or regime_default
+        d80c = 0.0
+        d80d = 0.0
+        if regime == 'old':
+            d80c = float((yield from _ask("80C deductions ₹ (max 1.5L): ", slots.d80c)) or 0)
+            d80d = float((yield from _ask("80D health insurance ₹ (max 25k): ", slots.d80d)) or 0)
+        yield from _say_response(ctx.engine.tax(TaxRequest(income, salaried, regime, d80c, d80d)))
+    except Exception as e:
+        yield SAY, f"Please enter valid numbers. {e}"
+
+
+@COMMANDS.command("sip", help="SIP calculator (future value or required monthly)",
+                  keywords=("sips", "s.i.p", "s.i.p."), priority=6)
+def flow_sip(ctx, slots: Slots = NO_SLOTS):
+    if slots.amount is not None:
+        choice = '2' if slots.wants_target else '1'
+    else:
+        yield SAY, "SIP calculator → Choose mode:"
+        yield SAY, " 1) Future value (given monthly SIP)"
+        yield SAY, " 2) Required SIP (given target)"
+        choice = (yield ASK, "Enter 1 or 2: ").strip()
+    try:
+        if choice == '1':
+            monthly = float((yield from _ask("Monthly SIP ₹: ", slots.amount)))
+            rate = float((yield from _ask("Expected annual return %: ", slots.rate)))
+            years = float((yield from _ask("Years: ", slots.tenure_years)))
+            yield from _say_response(ctx.engine.sip(SipRequest("fv", monthly, rate, years)))
+        elif choice == '2':
+            target = float((yield from _ask("Target amount ₹: ", slots.amount)))
+            rate = float((yield from _ask("Expected annual return %: ", slots.rate)))
+            years = float((yield from _ask("Years: ", slots.tenure_years)))
+            yield from _say_response(ctx.engine.sip(SipRequest("required", target, rate, years)))
+        else:
+            yield SAY, "Invalid choice."
+    except Exception:
+        yield SAY, "Please enter valid numbers."
+
+
+@COMMANDS.command("goal", help="Plan a goal (target amount, return, years)", keywords=("goals",), priority=7)
+def flow_goal(ctx, slots: Slots = NO_SLOTS):
+    try:
+        target = float((yield from _ask("Target amount ₹: ", slots.amount)))
+        years = float((yield from _ask("Years to goal: ", slots.tenure_years)))
+        rate = float((yield from _ask("Expected annual return %: ", slots.rate)))
+        yield from _say_response(ctx.engine.goal(GoalRequest(target, years, rate)))
+    except Exception:
+        yield SAY, "Please enter valid numbers."
+
+
+@COMMANDS.command("retirement", "retire", help="Retirement corpus estimate",
+                  keywords=("retired", "retiring"), priority=3)
+def flow_retirement(ctx, slots: Slots = NO_SLOTS):
+    try:
+        age = slots.age or ctx.profile.age or int((yield ASK, "Your age: "))
+        retire_age = int((yield from _ask("Retirement age (e.g., 60): ", slots.retire_age)))
+        error = ctx.engine.check_retirement_ages(age, retire_age)
+        if error:
+            yield from _say_response(error)
+            return
+        expense = ctx.profile.monthly_expenses or float((yield ASK, "Monthly expense today ₹: "))
+        inflation = float((yield ASK, "Inflation % (default 6): ") or 6.0)
+        swr = float((yield ASK, "Safe withdrawal rate % (default 3.5): ") or 3.5)
+        req = RetirementRequest(age, retire_age, expense, inflation, swr)
+        yield from _say_response(ctx.engine.retirement(req))
+        req.accumulation_return = float((yield from _ask("Expected return during accumulation % (e.g., 12): ",
+                                                         slots.rate)) or 12)
+        yield SAY, ctx.engine.retirement(req).lines[-1]
+    except Exception as e:
+        yield SAY, f"Please enter valid numbers. {e}"
+
+
+@COMMANDS.command("emergency", help="Emergency fund target", priority=4)
+def flow_emergency(ctx, slots: Slots = NO_SLOTS):
+    p = ctx.profile
+    if slots.amount is not None:
+        mexp = slots.amount
+    elif p.monthly_expenses is None:
         try:
-            risk = input(f"Risk (conservative/moderate/aggressive) [{self.profile.risk}]: ").strip() or self.profile.risk
-            horizon = int(input("Investment horizon (years): "))
-            allocation = suggest_allocation(risk, horizon)
-            print("Suggested allocation:")
-            for k, v in allocation.items():
-                print(f"  {k.capitalize():8s}: {int(v*100)}%")
+            mexp = float((yield ASK, "Monthly expenses ₹: "))
         except Exception:
-            print("Please enter valid inputs.")
+            yield SAY, "Please enter a number."
+            return
+    else:
+        mexp = p.monthly_expenses
+    months = p.emergency_months
+    try:
+        given = None if slots.months is None else str(slots.months)
+        s = (yield from _ask(f"Months of buffer [{months}]: ", given)).strip()
+        if s:
+            months = int(s)
+    except Exception:
+        pass
+    yield from _say_response(ctx.engine.emergency(EmergencyRequest(mexp, months)))
 
-    def cmd_tax(self, args: List[str]):
+
+@COMMANDS.command("emi", "loan", help="Loan EMI calculator", keywords=("emis", "loans"), priority=2)
+def flow_emi(ctx, slots: Slots = NO_SLOTS):
+    try:
+        principal = float((yield from _ask("Loan principal ₹: ", slots.amount)))
+        rate = float((yield from _ask("Annual interest %: ", slots.rate)))
+        years = float((yield from _ask("Tenure (years): ", slots.tenure_years)))
+        yield from _say_response(ctx.engine.emi(EmiRequest(principal, rate, years)))
+    except Exception:
+        yield SAY, "Please enter valid numbers."
+
+
+@COMMANDS.command("allocate", "allocation", help="Suggested asset allocation", priority=5)
+def flow_allocate(ctx, slots: Slots = NO_SLOTS):
+    try:
+        prompt = f"Risk (conservative/moderate/aggressive) [{ctx.profile.risk}]: "
+        risk = (yield from _ask(prompt, slots.risk)).strip() or ctx.profile.risk
+        horizon = int((yield from _ask("Investment horizon (years): ", slots.tenure_years)))
+        yield from _say_response(ctx.engine.allocate(AllocateRequest(risk, horizon)))
+    except Exception:
+        yield SAY, "Please enter valid inputs."
+
+
+@COMMANDS.command("profile", help="View or update your profile", priority=8)
+def flow_profile(ctx, slots: Slots = NO_SLOTS):
+    p = ctx.profile
+    yield SAY, "\nCurrent profile:"
+    yield SAY, json.dumps(asdict(p), indent=2)
+    yield SAY, "\nUpdate fields (press Enter to keep current):"
+    try:
+        updates = {
+            "name": (yield ASK, f"Name [{p.name}]: "),
+            "age": (yield ASK, f"Age [{p.age or ''}]: "),
+            "monthly_income": (yield ASK, f"Monthly income ₹ [{p.monthly_income or ''}]: "),
+            "monthly_expenses": (yield ASK, f"Monthly expenses ₹ [{p.monthly_expenses or ''}]: "),
+            "emergency_months": (yield ASK, f"Emergency months [{p.emergency_months}]: "),
+            "risk": (yield ASK, f"Risk (conservative/moderate/aggressive) [{p.risk}]: "),
+            "city": (yield ASK, f"City [{p.city or ''}]: "),
+            "regime_preference": (yield ASK, f"Tax regime preference (new/old) [{p.regime_preference or ''}]: "),
+        }
+        resp = ctx.engine.profile(ProfileRequest(p, updates))
+        ctx.profile = resp.data["profile"]
+        ctx.persist()
+        yield SAY, "\nSaved ✔\n"
+    except KeyboardInterrupt:
+        yield SAY, "\nUpdate cancelled."
+    except Exception as e:
+        yield SAY, f"[error] {e}"
+
+
+@COMMANDS.command("help", "menu", "?", help="Show this help", keywords=("what can you do",), priority=0)
+def flow_help(ctx, slots: Slots = NO_SLOTS):
+    yield SAY, HELP_TEXT
+
+
+@COMMANDS.command("quit", "exit", "q", help="Save & exit", label="quit/exit", exits=True)
+def flow_quit(ctx, slots: Slots = NO_SLOTS):
+    yield SAY, "Saving profile… bye!"
+    ctx.persist()
+
+
+HELP_TEXT = COMMANDS.help_text(HELP_TIP)
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Regex alternation for `words` factored into a prefix trie (spaces match any whitespace run)."""
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        alts = [(r"\s+" if ch == " " else re.escape(ch)) + build(node[ch]) for ch in sorted(node) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class IntentRouter:
+    """
+    Keyword intent matcher compiled into one regex. Keywords match whole words
+    only ("emi" does not fire inside "premium"), and when a message names several
+    intents the one listed first wins, wherever it appears in the text.
+
+    All keywords share a single trie-shaped alternation, so a message is scanned
+    once and the work per character depends on the keyword spelling, not on how
+    many intents are registered.
+    """
+    def __init__(self, intents: Iterable[Tuple[str, Iterable[str]]]):
+        self.intents: List[str] = []
+        self._keywords: Dict[str, Tuple[int, str]] = {}
+        for name, keywords in intents:
+            rank = len(self.intents)
+            self.intents.append(name)
+            for kw in keywords:
+                self._keywords.setdefault(" ".join(kw.lower().split()), (rank, name))
+        self._pattern = re.compile(r"(?<!\w)" + _trie_pattern(self._keywords) + r"(?!\w)", re.IGNORECASE)
+
+    def route(self, text: str) -> Optional[str]:
+        hits = self._pattern.findall(text)
+        if not hits:
+            return None
+        keywords = self._keywords
+        if len(hits) == 1:
+            hit = hits[0].lower()
+            return (keywords.get(hit) or keywords[" ".join(hit.split())])[1]
+        return min(keywords.get(h) or keywords[" ".join(h.split())] for h in map(str.lower, hits))[1]
+
+
+# Built from the registry, highest priority first: "help with my tax" shows help,
+# "tax on my sip" goes to tax, "loan of 2 cr" goes to emi.
+INTENTS = COMMANDS.intents()
+
+
+def freeform_command(text: str) -> Optional[str]:
+    """Command name a freeform message asks for, or None."""
+    cmd = COMMANDS.route(text)
+    return None if cmd is None else cmd.name
+
+
+# ------------------- Sessions -------------------
+
+class ChatSession:
+    """
+    One conversation: its profile and the flow (if any) waiting for an answer.
+    The profile is written to the store only when it differs from the one the
+    session was opened with or last saved.
+    """
+    __slots__ = ("session_id", "profile", "engine", "flow", "prompt", "last_active", "_store", "_saved")
+
+    def __init__(self, session_id: str, profile: UserProfile, engine: PlannerEngine,
+                 store: Optional[ProfileStore] = None):
+        self.session_id = session_id
+        self.profile = profile
+        self.engine = engine
+        self.flow = None
+        self.prompt: Optional[str] = None
+        self.last_active = time.monotonic()
+        self._store = store
+        self._saved = profile_to_dict(profile)  # state known to be in the store (or the fresh default)
+
+    def is_dirty(self) -> bool:
+        return profile_to_dict(self.profile) != self._saved
+
+    def persist(self) -> bool:
+        """Save the profile if it changed; returns whether it was written."""
+        if self._store is None or not self.is_dirty():
+            return False
+        data = profile_to_dict(self.profile)
+        self._store.put(self.session_id, self.profile)
+        self._saved = data
+        return True
+
+
+class SessionManager:
+    """
+    Many concurrent chats in one process. Each session parks its flow generator
+    between messages, so a pending prompt (the SIP mode choice, the old-regime
+    80C/80D follow-ups, ...) costs a suspended frame rather than a thread.
+
+      replies = sessions.feed("alice", "tax")      # [..., "Gross annual income ₹: "]
+      replies = sessions.feed("alice", "1800000")  # next prompt
+
+    Sessions idle longer than `idle_timeout` seconds are dropped by evict_idle()
+    (run periodically by run_evictor()), and the least recently used session is
+    dropped when more than `max_sessions` are open. Profiles are loaded from
+    `store` when one is given and saved back, if they changed, when a session
+    is closed or dropped; otherwise they live only in memory.
+    """
+    def __init__(self, engine: Optional[PlannerEngine] = None, store: Optional[ProfileStore] = None,
+                 idle_timeout: float = 900.0, max_sessions: int = 100_000,
+                 commands: Optional[CommandRegistry] = None):
+        self.engine = engine or PlannerEngine()
+        self.commands = commands or COMMANDS
+        self.store = store
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def waiting(self, session_id: str) -> bool:
+        """True if the session is open and its last reply ended with a prompt."""
+        s = self._sessions.get(session_id)
+        return s is not None and s.flow is not None
+
+    def session(self, session_id: str) -> ChatSession:
+        """Open (or touch) a session, moving it to the most-recently-used end."""
+        s = self._sessions.get(session_id)
+        if s is None:
+            profile = self.store.get(session_id) if self.store is not None else None
+            s = ChatSession(session_id, profile or UserProfile(), self.engine, self.store)
+            self._sessions[session_id] = s
+            while len(self._sessions) > self.max_sessions:
+                self._drop(next(iter(self._sessions)))
+        else:
+            self._sessions.move_to_end(session_id)
+            s.last_active = time.monotonic()
+        return s
+
+    def feed(self, session_id: str, text: str) -> List[str]:
+        """Handle one message; returns the reply lines, ending with the next prompt if one is pending."""
+        s = self.session(session_id)
+        out: List[str] = []
+        if s.flow is not None:
+            self._advance(s, text, out)
+            return out
+        raw = text.strip()
+        if not raw:
+            return out
+        slots = NO_SLOTS
+        cmd = self.commands.get(raw.lower())
+        if cmd is None:
+            cmd = self.commands.route(raw)
+            if cmd is None:
+                out.append("I didn't catch that. Type 'help' for options.")
+                return out
+            slots = extract_slots(raw)
+        s.flow = cmd.flow(s, slots)
+        self._advance(s, None, out)
+        if cmd.exits:
+            self.close(session_id)
+        return out
+
+    @staticmethod
+    def _advance(s: ChatSession, answer: Optional[str], out: List[str]) -> None:
+        send = s.flow.send
         try:
-            income = float(input("Gross annual income ₹: "))
-            salaried = (input("Are you salaried? (y/n) [y]: ").strip().lower() or 'y') == 'y'
-            regime_default = self.profile.regime_preference or 'new'
-            regime = input(f"Regime new/old [{regime_default}]: ").strip().lower() or regime_default
-            d80c = 0.0
-            d80d = 0.0
-            if regime == 'old':
-                d80c = float(input("80C deductions ₹ (max 1.5L): ") or 0)
-                d80d = float(input("80D health insurance ₹ (max 25k): ") or 0)
-            res = self.tax_calc.estimate(income, salaried, regime, d80c, d80d)
-            print("\n— Tax Estimate —")
-            print(f"Regime: {'New' if res['regime']==1.0 else 'Old'}")
-            print(f"Gross Income:      {currency(res['gross'])}")
-            if res['std_deduction']:
-                print(f"Std Deduction:     {currency(res['std_deduction'])}")
-            if res['deductions']:
-                print(f"Other Deductions:  {currency(res['deductions'])}")
-            print(f"Taxable Income:    {currency(res['taxable'])}")
-            print(f"Base Tax:          {currency(res['base_tax'])}")
-            if res['rebate']:
-                print(f"Rebate (87A):      -{currency(res['rebate'])}")
-            print(f"Cess (4%):         {currency(res['cess'])}")
-            print(f"Total Tax:         {currency(res['total_tax'])}")
-            print(f"Effective Rate:    {res['effective_rate']*100:.2f}%\n")
-        except Exception as e:
-            print(f"Please enter valid numbers. {e}")
+            while True:
+                kind, text = send(answer)
+                out.append(text)
+                if kind == ASK:
+                    s.prompt = text
+                    return
+                answer = None
+        except StopIteration:
+            s.flow = s.prompt = None
+
+    def close(self, session_id: str) -> bool:
+        return self._drop(session_id)
+
+    def _drop(self, session_id: str) -> bool:
+        """Close the session's flow and save its profile to the store (if any, and if changed)."""
+        s = self._sessions.pop(session_id, None)
+        if s is None:
+            return False
+        if s.flow is not None:
+            s.flow.close()
+            s.flow = s.prompt = None
+        s.persist()
+        return True
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Drop sessions idle past the timeout; returns how many were dropped."""
+        cutoff = (time.monotonic() if now is None else now) - self.idle_timeout
+        dropped = 0
+        # Oldest first: stop at the first session that is still fresh.
+        while self._sessions:
+            sid, s = next(iter(self._sessions.items()))
+            if s.last_active > cutoff:
+                break
+            self._drop(sid)
+            dropped += 1
+        return dropped
+
+    async def run_evictor(self, interval: float = 30.0) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            self.evict_idle()
+
+
+class Chatbot:
+    """Interactive REPL: drives the conversation flows with input() and print()."""
+    def __init__(self, commands: Optional[CommandRegistry] = None):
+        self.profile = load_profile()
+        self.tax_calc = IndiaTaxCalculator()
+        self.engine = PlannerEngine(self.tax_calc)
+        self.commands = commands or COMMANDS
+
+    def persist(self) -> None:
+        save_profile(self.profile)
+
+    @staticmethod
+    def _drive(flow) -> None:
+        answer = None
+        step = flow.send
+        try:
+            while True:
+                kind, text = step(answer)
+                step = flow.send
+                if kind == SAY:
+                    print(text)
+                    answer = None
+                    continue
+                try:
+                    answer = input(text)
+                except BaseException as e:  # let the flow's own handlers see it, as inline input() did
+                    step = lambda _, e=e: flow.throw(e)
+        except StopIteration:
+            pass
 
     # ------------------- Intent Parsing (lightweight) -------------------
     def handle_freeform(self, text: str) -> bool:
-        t = text.lower()
-        # Quick routes
-        if any(k in t for k in ["help", "menu", "what can you do"]):
-            self.cmd_help([]); return True
-        if "tax" in t:
-            self.cmd_tax([]); return True
-        if "emi" in t:
-            self.cmd_emi([]); return True
-        if "retire" in t:
-            self.cmd_retirement([]); return True
-        if "emergency" in t:
-            self.cmd_emergency([]); return True
-        if "allocate" in t or "allocation" in t:
-            self.cmd_allocate([]); return True
-        if "sip" in t or "s.i.p" in t:
-            self.cmd_sip([]); return True
-        if "goal" in t:
-            self.cmd_goal([]); return True
-        if "profile" in t:
-            self.cmd_profile([]); return True
-        return False
+        cmd = self.commands.route(text)
+        if cmd is None:
+            return False
+        self._drive(cmd.flow(self, extract_slots(text)))
+        return True
 
     # ------------------- Main Loop -------------------
     def run(self):
@@ -480,6 +3279,7 @@ class Chatbot:
 Type 'help' to see options. Type 'quit' to exit and save.
 Disclaimer: Educational guidance only. Not investment/tax advice.
 """.strip())
+        commands = self.commands
         while True:
             try:
                 raw = input("\n> ").strip()
@@ -488,32 +3288,259 @@ Disclaimer: Educational guidance only. Not investment/tax advice.
                 break
             if not raw:
                 continue
-            if raw.lower() in ("quit", "exit", "q"):  
-                print("Saving profile… bye!")
-                save_profile(self.profile)
-                break
-            # Try freeform intents first
-            if self.handle_freeform(raw):
+            # Exact commands are one dict hit; anything else goes to the intent router
+            cmd = commands.get(raw.lower())
+            if cmd is None:
+                if not self.handle_freeform(raw):
+                    print("I didn't catch that. Type 'help' for options.")
                 continue
-            # Or parse as structured command
-            parts = raw.split()
-            cmd, args = parts[0].lower(), parts[1:]
-            handler = {
-                "help": self.cmd_help,
-                "profile": self.cmd_profile,
-                "emergency": self.cmd_emergency,
-                "sip": self.cmd_sip,
-                "goal": self.cmd_goal,
-                "emi": self.cmd_emi,
-                "retirement": self.cmd_retirement,
-                "allocate": self.cmd_allocate,
-                "tax": self.cmd_tax,
-            }.get(cmd)
-            if handler:
-                handler(args)
-            else:
-                print("I didn't catch that. Type 'help' for options.")
+            self._drive(cmd.flow(self, NO_SLOTS))
+            if cmd.exits:
+                break
+
+
+# ----------------------------- Batch Tax CLI -----------------------------
+
+# Input columns (TaxRequest field names); only income is required, others use these defaults
+TAX_BATCH_DEFAULTS = {"income": None, "salaried": True, "regime": "new", "d80c": 0.0, "d80d": 0.0}
+
+
+def _tax_batch_estimate(calc: IndiaTaxCalculator, args: List[list]) -> Dict[str, list]:
+    if np is not None:
+        return {k: v.tolist() for k, v in calc.estimate_many(*args).items()}
+    rows = [calc.estimate(*row) for row in zip(*args)]
+    return {k: [r[k] for r in rows] for k in calc.estimate(0.0)}
+
+
+def _tax_batch_columns(columns: Dict[str, list], fy: Optional[str] = None, first_row: int = 1) -> Dict[str, list]:
+    """
+    Estimate one chunk; input columns pass through and estimate() keys are appended
+    (regime as "new"/"old", when the input has no regime column of its own).
+    An `fy` column picks the rule year per row (blank rows use `fy`); rows are
+    grouped by year so each group is one vectorized call on that year's tables.
+    `first_row` is the input row number of the chunk's first row, for errors.
+    """
+    if "income" not in columns:
+        raise ValueError(f"tax-batch input needs an 'income' column (found: {', '.join(columns) or 'none'})")
+    n = len(columns["income"])
+    args = []
+    for name, default in TAX_BATCH_DEFAULTS.items():
+        col = columns.get(name)
+        if col is None:
+            args.append([default] * n)
+            continue
+        if name == "income":
+            try:
+                args.append([float(v) for v in col])
+            except (TypeError, ValueError):
+                for i, v in enumerate(col):
+                    if v in ("", None):
+                        raise ValueError(f"row {first_row + i}: income is blank") from None
+                    try:
+                        float(v)
+                    except ValueError:
+                        raise ValueError(f"row {first_row + i}: income {v!r} is not a number") from None
+                raise
+        elif name == "salaried":
+            args.append([default if v in ("", None) else _as_bool(v) for v in col])
+        elif name == "regime":
+            args.append([default if v in ("", None) else str(v) for v in col])
+        else:
+            args.append([default if v in ("", None) else float(v) for v in col])
+    groups: Dict[Optional[str], List[int]] = {}
+    for i, year in enumerate(columns.get("fy") or [None] * n):
+        groups.setdefault(fy if year in ("", None) else year, []).append(i)
+    if len(groups) <= 1:
+        year = next(iter(groups), fy)
+        results = _tax_batch_estimate(IndiaTaxCalculator() if year is None else year_calculator(year), args)
+    else:
+        results = {}
+        for year, rows in groups.items():
+            calc = IndiaTaxCalculator() if year is None else year_calculator(year)
+            part = _tax_batch_estimate(calc, [[col[i] for i in rows] for col in args])
+            for k, v in part.items():
+                dest = results.setdefault(k, [None] * n)
+                for i, x in zip(rows, v):
+                    dest[i] = x
+    out = dict(columns)
+    for k, v in results.items():
+        if k == "regime":
+            if k not in columns:  # an input regime column passes through as given
+                out[k] = ["new" if r else "old" for r in v]
+        elif k != "gross":  # gross is the income column
+            out[k] = v
+    return out
+
+
+def _tax_batch_job(job: Tuple[int, Dict[str, list]], fy: Optional[str] = None) -> Dict[str, list]:
+    """_tax_batch_columns on a (first_row, columns) pair, so it can be mapped over a pool."""
+    first_row, columns = job
+    return _tax_batch_columns(columns, fy, first_row)
+
+
+def _read_chunks(path: str, chunk_size: int) -> Iterator[Dict[str, list]]:
+    """
+    Columnar chunks of a CSV or Parquet file. CSV rows shorter than the header
+    are padded with "" and blank rows are skipped; a row with more fields than
+    the header is an error.
+    """
+    if path.endswith((".parquet", ".pq")):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet input requires pyarrow (pip install pyarrow)") from None
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pydict()
+        return
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next((row for row in reader if any(v.strip() for v in row)), None)
+        if header is None:
+            return
+        width = len(header)
+
+        def rows():
+            for row in reader:
+                if len(row) < width:
+                    row += [""] * (width - len(row))
+                elif len(row) > width:
+                    raise ValueError(f"{path}, line {reader.line_num}: {len(row)} fields but the header has {width}")
+                if any(v.strip() for v in row):
+                    yield row
+
+        rows = rows()
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield dict(zip(header, map(list, zip(*chunk))))
+
+
+def _numbered_chunks(chunks: Iterable[Dict[str, list]]) -> Iterator[Tuple[int, Dict[str, list]]]:
+    """Pair each chunk with the (1-based) input row number of its first row."""
+    first_row = 1
+    for columns in chunks:
+        yield first_row, columns
+        first_row += len(next(iter(columns.values()), ()))
+
+
+def _tax_batch_schema(in_path: str, pa, columns: Dict[str, list]):
+    """
+    Parquet schema for tax_batch output: computed columns are float64, regime is
+    a string and pass-through columns keep their input type (strings for CSV).
+    """
+    source = {}
+    if in_path.endswith((".parquet", ".pq")):
+        import pyarrow.parquet as pq
+        source = {f.name: f.type for f in pq.ParquetFile(in_path).schema_arrow}
+    computed = set(IndiaTaxCalculator().estimate(0.0)) - {"regime", "gross"}
+    return pa.schema([(name, pa.float64() if name in computed else source.get(name, pa.string()))
+                      for name in columns])
+
+
+class _ChunkWriter:
+    """
+    Appends columnar chunks to a CSV or Parquet file. Every chunk is written in
+    the first chunk's column order, and a chunk with other columns raises
+    ValueError. Parquet output has one schema for the whole file, built by
+    `schema(pa, columns)` from the first chunk (default: every column float64).
+    """
+    def __init__(self, path: str, schema: Optional[Callable] = None):
+        self.path = path
+        self.parquet = path.endswith((".parquet", ".pq"))
+        self.schema = schema
+        self._file = self._writer = self._schema = None
+        self._columns: Optional[List[str]] = None
+
+    def write(self, columns: Dict[str, list]) -> None:
+        if self._columns is None:
+            self._columns = list(columns)
+        elif list(columns) != self._columns:
+            if sorted(columns) != sorted(self._columns):
+                raise ValueError(f"chunk columns ({', '.join(columns)}) differ from the first chunk's "
+                                 f"({', '.join(self._columns)})")
+            columns = {name: columns[name] for name in self._columns}
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self._writer is None:
+                self._schema = (self.schema(pa, columns) if self.schema is not None
+                                else pa.schema([(name, pa.float64()) for name in columns]))
+                self._writer = pq.ParquetWriter(self.path, self._schema)
+            self._writer.write_table(pa.Table.from_pydict(columns, schema=self._schema))
+            return
+        if self._writer is None:
+            self._file = open(self.path, "w", newline="", encoding="utf-8")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(columns)
+        self._writer.writerows(zip(*columns.values()))
+
+    def close(self) -> None:
+        if self.parquet and self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def tax_batch(in_path: str, out_path: str, chunk_size: int = 50000, workers: int = 1,
+              fy: Optional[str] = None) -> int:
+    """
+    Stream an employee file (CSV or Parquet with an `income` column and optional
+    salaried/regime/d80c/d80d/fy) through the tax engine chunk by chunk, writing
+    results as they are ready; memory stays flat whatever the file size. With
+    workers > 1 chunks are computed in a process pool, output order preserved.
+    `fy` selects the TAX_RULES year for rows without an `fy` value (default: the
+    built-in TaxConfig). Returns the number of rows processed.
+    """
+    estimate = partial(_tax_batch_job, fy=fy)
+    chunks = _numbered_chunks(_read_chunks(in_path, chunk_size))
+    writer = _ChunkWriter(out_path, partial(_tax_batch_schema, in_path))
+    rows = 0
+    try:
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = _imap_bounded(pool, estimate, chunks, max_pending=2 * workers, ordered=True)
+                for out in results:
+                    writer.write(out)
+                    rows += len(out["income"])
+        else:
+            for out in map(estimate, chunks):
+                writer.write(out)
+                rows += len(out["income"])
+    finally:
+        writer.close()
+    return rows
+
+# ----------------------------- Entry Point -----------------------------
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="PFC.py", description="Personal Finance Chatbot (India)")
+    sub = parser.add_subparsers(dest="command")
+    serve = sub.add_parser("serve", help="run the JSON HTTP service")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8080)
+    serve.add_argument("--workers", type=int, default=None, help="processes for batch endpoints")
+    batch = sub.add_parser("tax-batch", help="estimate tax for every row of a CSV/Parquet file")
+    batch.add_argument("input")
+    batch.add_argument("output")
+    batch.add_argument("--chunk-size", type=int, default=50000)
+    batch.add_argument("--workers", type=int, default=1)
+    batch.add_argument("--fy", help=f"financial year for rows without an fy column (packs in {TAX_RULES_DIR})")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        try:
+            asyncio.run(PlannerService(workers=args.workers).serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "tax-batch":
+        start = time.perf_counter()
+        rows = tax_batch(args.input, args.output, args.chunk_size, args.workers, args.fy)
+        elapsed = time.perf_counter() - start
+        print(f"{rows:,} rows in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s)", file=sys.stderr)
+    else:
+        Chatbot().run()
 
 
 if __name__ == "__main__":
-    Chatbot().run()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""
+Benchmark for the freeform intent router in PFC.py (stdlib only).
+
+    python bench_router.py --repeat 200 --extra-intents 0 50 200
+
+Routes a corpus of chat utterances through the old substring cascade and the
+compiled IntentRouter, reports messages/s for each, lists the utterances on
+which they disagree, and repeats the timing with synthetic intents added to
+show how each approach scales with the number of intents.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import string
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from PFC import INTENTS, IntentRouter
+
+CORPUS = [
+    "help", "menu", "what can you do?", "hi, what can you do for me",
+    "tax", "how much tax will I pay on 18 lakh", "tax for 18 lakh new regime",
+    "old or new regime which saves more taxes", "compare tax regimes for 12L salary",
+    "is my health insurance premium deductible", "I pay a premium of 25k for my parents",
+    "calculate emi for 40 lakh home loan", "emi on car loan 8 lakh at 9% for 5 years",
+    "what will my EMIs be", "can I retire at 50", "retirement corpus for 50k monthly expense",
+    "when can I afford retiring early", "how big should my emergency fund be",
+    "emergency fund for 6 months", "suggest an asset allocation", "allocate 10 lakh aggressively",
+    "need ₹50L in 15 yrs at 12% – how much SIP?", "start a sip of 10k", "s.i.p returns for 20 years",
+    "my goal is a house in 7 years", "set a goal of 25 lakh for education", "show my profile",
+    "update profile", "syntax error in my spreadsheet", "thanks!", "bye", "ok", "what's a good mutual fund",
+    "the premium features cost extra", "my sister is pursuing an mba", "gossip about markets",
+    "remind me later", "calculate the tax on my sip gains", "i'm retired, what allocation suits me",
+    "ELSS vs PPF for 80C", "how does the new regime rebate work", "emigration plans, need advice",
+    "goalkeeper salary", "taxi fare split", "help me with my emi", "profile picture", "retiree budget",
+]
+
+
+def substring_cascade(text: str) -> Optional[str]:
+    """The routing handle_freeform used before the compiled router (kept for comparison)."""
+    t = text.lower()
+    if any(k in t for k in ["help", "menu", "what can you do"]):
+        return "help"
+    if "tax" in t:
+        return "tax"
+    if "emi" in t:
+        return "emi"
+    if "retire" in t:
+        return "retirement"
+    if "emergency" in t:
+        return "emergency"
+    if "allocate" in t or "allocation" in t:
+        return "allocate"
+    if "sip" in t or "s.i.p" in t:
+        return "sip"
+    if "goal" in t:
+        return "goal"
+    if "profile" in t:
+        return "profile"
+    return None
+
+
+def synthetic_intents(n: int, seed: int = 7) -> List[Tuple[str, Tuple[str, ...]]]:
+    rng = random.Random(seed)
+    return [(f"x{i}", tuple("".join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 10))) for _ in range(3)))
+            for i in range(n)]
+
+
+def cascade_with(extra: Sequence[Tuple[str, Sequence[str]]]) -> Callable[[str], Optional[str]]:
+    """The cascade extended the way it would grow: one more `in` chain per intent."""
+    def route(text: str) -> Optional[str]:
+        hit = substring_cascade(text)
+        if hit is not None:
+            return hit
+        t = text.lower()
+        for name, keywords in extra:
+            if any(k in t for k in keywords):
+                return name
+        return None
+    return route
+
+
+def rate(fn: Callable[[str], Optional[str]], corpus: List[str], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in corpus:
+            fn(text)
+    return len(corpus) * repeat / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200, help="passes over the corpus per timing")
+    parser.add_argument("--extra-intents", type=int, nargs="+", default=[0, 50, 200])
+    args = parser.parse_args()
+
+    router = IntentRouter(INTENTS)
+    diffs = [(t, substring_cascade(t), router.route(t)) for t in CORPUS if substring_cascade(t) != router.route(t)]
+    print(f"{len(CORPUS)} utterances, {len(diffs)} routed differently (cascade -> router):")
+    for text, old, new in diffs:
+        print(f"  {text!r}: {old} -> {new}")
+
+    print(f"\n{'intents':>8} {'cascade msg/s':>15} {'router msg/s':>15}")
+    for n in args.extra_intents:
+        extra = synthetic_intents(n)
+        cascade = cascade_with(extra)
+        routed = IntentRouter(list(INTENTS) + extra).route
+        print(f"{len(INTENTS) + n:>8} {rate(cascade, CORPUS, args.repeat):>15,.0f} "
+              f"{rate(routed, CORPUS, args.repeat):>15,.0f}")
+
+
+if __name__ == "__main__":
+    main()
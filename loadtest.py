@@ -0,0 +1,128 @@
+"""
+Load test for the PFC.py JSON service (stdlib only).
+
+    python PFC.py serve --port 8080 &
+    python loadtest.py --port 8080 --connections 32 --pipeline 8 --duration 10
+
+or let the script start and stop a local server itself:
+
+    python loadtest.py --spawn
+
+Each connection keeps `--pipeline` requests in flight on one keep-alive
+socket and the script reports throughput and latency percentiles.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import List
+
+DEFAULT_BODIES = {
+    "/tax": {"income": 1800000, "regime": "new"},
+    "/sip": {"mode": "required", "amount": 5000000, "rate": 12, "years": 15},
+    "/emi": {"principal": 4000000, "rate": 8.5, "years": 20},
+    "/retirement": {"age": 30, "retire_age": 60, "monthly_expense": 50000, "accumulation_return": 12},
+    "/allocate": {"risk": "moderate", "horizon": 12},
+}
+
+
+def build_request(host: str, path: str, body: dict) -> bytes:
+    payload = json.dumps(body).encode()
+    head = (f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n\r\n")
+    return head.encode() + payload
+
+
+async def read_response(reader: asyncio.StreamReader) -> int:
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    await reader.readexactly(length)
+    return status
+
+
+async def worker(host: str, port: int, request: bytes, depth: int, deadline: float,
+                 latencies: List[float], errors: List[int]) -> None:
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            writer.write(request * depth)  # pipelined batch on one connection
+            await writer.drain()
+            for _ in range(depth):
+                if await read_response(reader) != 200:
+                    errors.append(1)
+                latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def wait_for_port(host: str, port: int, timeout: float = 10.0) -> None:
+    end = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.perf_counter() > end:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def run(args) -> None:
+    body = json.loads(args.body) if args.body else DEFAULT_BODIES.get(args.path, {})
+    request = build_request(args.host, args.path, body)
+    await wait_for_port(args.host, args.port)
+    latencies: List[float] = []
+    errors: List[int] = []
+    deadline = time.perf_counter() + args.duration
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(args.host, args.port, request, args.pipeline, deadline, latencies, errors)
+                           for _ in range(args.connections)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def pct(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000 if latencies else 0.0
+
+    print(f"{args.path}: {len(latencies)} requests in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:,.0f} req/s), {len(errors)} errors")
+    print(f"latency ms  p50 {pct(50):.2f}  p90 {pct(90):.2f}  p99 {pct(99):.2f}  max {pct(100):.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--path", default="/tax", help=f"endpoint; defaults exist for {', '.join(DEFAULT_BODIES)}")
+    parser.add_argument("--body", help="JSON request body (overrides the default for --path)")
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--pipeline", type=int, default=4, help="requests in flight per connection")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds")
+    parser.add_argument("--spawn", action="store_true", help="start `PFC.py serve` for the run")
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn:
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "PFC.py")
+        server = subprocess.Popen([sys.executable, script, "serve", "--host", args.host, "--port", str(args.port)])
+    try:
+        asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
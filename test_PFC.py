@@ -0,0 +1,816 @@
+import asyncio
+import csv
+import json
+import math
+import random
+import time
+from dataclasses import replace
+from datetime import date
+
+import pytest
+
+import PFC
+
+
+# ------------------- Tax: scalar vs batch -------------------
+
+def calculators():
+    yield PFC.IndiaTaxCalculator()
+    for fy in PFC.TAX_RULES.years():
+        yield PFC.year_calculator(fy)
+
+
+@pytest.mark.parametrize("calc", list(calculators()), ids=lambda c: c.fy or "default")
+def test_estimate_many_matches_estimate(calc):
+    np = pytest.importorskip("numpy")
+    rng = np.random.default_rng(0)
+    income = np.concatenate([rng.uniform(0, 8e7, 2000), rng.uniform(6e5, 1.4e6, 2000),
+                             [0.0, 7e5, 7.5e5, 1.2e6, 5e6, 5.05e6, 1e7, 2e7, 5e7]])
+    salaried = rng.random(income.size) < 0.7
+    regime = np.where(rng.random(income.size) < 0.5, "new", "old")
+    d80c = rng.uniform(0, 2e5, income.size)
+    d80d = rng.uniform(0, 4e4, income.size)
+    batch = calc.estimate_many(income, salaried, regime, d80c, d80d)
+    for i in range(income.size):
+        row = calc.estimate(float(income[i]), bool(salaried[i]), str(regime[i]), float(d80c[i]), float(d80d[i]))
+        for key, value in row.items():
+            assert batch[key][i] == pytest.approx(value, abs=1e-6), (key, income[i], regime[i])
+
+
+# ------------------- Tax: compiled slab tables -------------------
+
+def reference_slab_tax(taxable: float, slabs) -> float:
+    """The original per-slab loop that CompiledSlabs replaced."""
+    tax, lower = 0.0, 0.0
+    for slab in slabs:
+        upper = slab.up_to if slab.up_to is not None else taxable
+        if taxable > lower:
+            segment = min(taxable, upper) - lower
+            if segment > 0:
+                tax += segment * slab.rate
+        lower = upper
+        if taxable <= lower:
+            break
+    return tax
+
+
+def test_compiled_slabs_match_original_loop():
+    cfg = PFC.TaxConfig()
+    for slabs in (cfg.slabs_new, cfg.slabs_old):
+        table = PFC.CompiledSlabs.compile(slabs)
+        for taxable in [0.0, 1.0, 250000.0, 300000.0, 300001.0, 1e6, 1.5e6, 2e7] + list(range(0, 3000000, 7919)):
+            assert table.tax(taxable) == pytest.approx(reference_slab_tax(taxable, slabs), abs=1e-6)
+
+
+def test_compiled_tables_follow_in_place_config_edits():
+    calc = PFC.IndiaTaxCalculator()
+    assert calc.estimate(1800000, True, "new")["base_tax"] == pytest.approx(225000.0)
+    calc.cfg.slabs_new[-1].rate = 0.40           # edit a TaxSlab
+    calc.cfg.slabs_new.insert(-1, PFC.TaxSlab(1700000, 0.25))  # edit the list
+    assert calc.estimate(1800000, True, "new") == PFC.IndiaTaxCalculator(calc.cfg).estimate(1800000, True, "new")
+    assert calc.estimate(1800000, True, "new")["base_tax"] == pytest.approx(150000.0 + 50000.0 + 20000.0)
+    calc.cfg.slabs_new = [PFC.TaxSlab(None, 0.10)]  # replace the list
+    assert calc.estimate(1050000, True, "new")["base_tax"] == pytest.approx(100000.0)
+
+
+# ------------------- Tax: estimate cache -------------------
+
+def test_estimate_cache_counts_hits_and_evicts_lru():
+    calc = PFC.IndiaTaxCalculator(cache_size=2)
+    first = calc.estimate(1800000)
+    first["total_tax"] = -1.0  # callers get a copy
+    assert calc.estimate(1800000.0, 1, " NEW ", 5e5, 5e5)["total_tax"] != -1.0  # same normalized key
+    calc.estimate(900000)
+    calc.estimate(2500000)  # evicts 18L
+    assert calc.cache_info() == PFC.TaxCacheInfo(hits=1, misses=3, evictions=1, maxsize=2, currsize=2)
+
+
+def test_estimate_cache_misses_after_in_place_config_edit():
+    calc = PFC.IndiaTaxCalculator(cache_size=16)
+    assert calc.estimate(1800000)["total_tax"] == pytest.approx(234000.0)
+    calc.cfg.cess_rate = 0.10
+    assert calc.estimate(1800000)["total_tax"] == pytest.approx(247500.0)
+    calc.cfg.slabs_new[-1].rate = 0.50
+    assert calc.estimate(1800000) == PFC.IndiaTaxCalculator(calc.cfg).estimate(1800000)
+    assert calc.cache_info().hits == 0
+
+
+# ------------------- Tax: known values -------------------
+
+def pre_cess(res) -> float:
+    return res["base_tax"] - res["rebate"] + res["surcharge"] - res["marginal_relief"]
+
+
+def test_new_regime_rebate_relief_known_value():
+    res = PFC.IndiaTaxCalculator().estimate(710000 + 50000, True, "new")
+    assert res["taxable"] == 710000.0 and res["base_tax"] == pytest.approx(26000.0)
+    assert pre_cess(res) == pytest.approx(10000.0)  # relief caps tax at the 10,000 earned above 7L
+    assert res["total_tax"] == pytest.approx(10400.0)
+
+
+@pytest.mark.parametrize("taxable, surcharge, relief, total", [
+    (5000000, 0.0, 0.0, 1365000.0),             # 12,500 + 1,00,000 + 30% of 40L, no surcharge yet
+    (5010000, 131550.0, 124550.0, 1375400.0),   # 10% surcharge, capped at tax(50L) + 10,000
+    (10000000, 281250.0, 0.0, 3217500.0),
+    (10010000, 422325.0, 134075.0, 3227900.0),  # 15% surcharge, capped at tax(1Cr) + 10,000
+    (50010000, 5481735.0, 1771610.0, 19266650.0),  # old regime's 37% tier, capped at tax(5Cr) + 10,000
+    (54950000, 6030075.0, 0.0, 23220678.0),
+])
+def test_old_regime_surcharge_thresholds(taxable, surcharge, relief, total):
+    res = PFC.IndiaTaxCalculator().estimate(taxable + 50000, True, "old")
+    assert res["taxable"] == taxable
+    assert (res["surcharge"], res["marginal_relief"]) == (pytest.approx(surcharge), pytest.approx(relief))
+    assert res["total_tax"] == pytest.approx(total)
+
+
+def test_new_regime_surcharge_stops_at_25_percent():
+    res = PFC.IndiaTaxCalculator().estimate(60050000, True, "new")
+    assert res["surcharge"] == pytest.approx(0.25 * res["base_tax"])
+
+
+def test_fy2025_26_rebate_relief_known_value():
+    res = PFC.year_calculator("2025-26").estimate(1225000 + 75000, True, "new")
+    assert res["taxable"] == 1225000.0 and res["base_tax"] == pytest.approx(63750.0)
+    assert pre_cess(res) == pytest.approx(25000.0)
+    assert res["total_tax"] == pytest.approx(26000.0)
+
+
+# ------------------- Tax: rule packs by year -------------------
+
+def test_year_calculator_follows_registry_replacements():
+    original = PFC.TAX_RULES.get("2025-26")
+    calc = PFC.year_calculator("FY2025-26")
+    assert PFC.year_calculator("2025-26") is calc
+    assert calc.estimate(1800000)["total_tax"] == pytest.approx(150800.0)
+    try:
+        PFC.TAX_RULES.register(replace(original, cess_rate=0.10))
+        assert PFC.year_calculator("2025-26").estimate(1800000)["total_tax"] == pytest.approx(159500.0)
+        res = PFC.PlannerEngine().handle_dict("tax", {"income": 1800000, "fy": "2025-26"})
+        assert res.data["total_tax"] == pytest.approx(159500.0)
+    finally:
+        PFC.TAX_RULES.register(original)
+    assert PFC.year_calculator("2025-26").estimate(1800000)["total_tax"] == pytest.approx(150800.0)
+
+
+# ------------------- Tax: old vs new regime -------------------
+
+def test_regime_intervals_cover_the_range_and_agree_with_estimate():
+    calc = PFC.IndiaTaxCalculator()
+    intervals = calc.regime_intervals(0, 5e7, True, 200000)
+    assert intervals[0].lo == 0 and intervals[-1].hi == 5e7
+    assert all(a.hi == b.lo and a.better != b.better for a, b in zip(intervals, intervals[1:]))
+    for iv in intervals:
+        mid = (iv.lo + iv.hi) / 2
+        old = calc.estimate(mid, True, "old", 150000, 25000)["total_tax"]
+        new = calc.estimate(mid, True, "new")["total_tax"]
+        assert iv.better == ("old" if old < new else "new" if old > new else "either"), iv
+
+
+def test_regime_intervals_single_income_splits_80c_80d():
+    calc = PFC.IndiaTaxCalculator()
+    for income in range(500000, 2500001, 50000):
+        for total in (0.0, 150000.0, 175000.0, 300000.0):
+            [interval] = calc.regime_intervals(income, income, True, total)
+            old = calc.estimate(income, True, "old", min(total, 150000.0), max(0.0, total - 150000.0))["total_tax"]
+            new = calc.estimate(income, True, "new")["total_tax"]
+            expected = "old" if old < new - 1e-6 else ("new" if old > new + 1e-6 else "either")
+            assert interval.better == expected, (income, total)
+    with pytest.raises(ValueError):
+        calc.regime_intervals(2e6, 1e6)
+
+
+# ------------------- Loans -------------------
+
+def test_amortization_schedule_closes_the_loan():
+    schedule = PFC.amortization_schedule(4000000, 8.5, 20)
+    assert len(schedule) == 240
+    assert schedule.closing[-1] == 0.0
+    assert schedule.total_interest == pytest.approx(PFC.emi(4000000, 8.5, 20) * 240 - 4000000)
+    assert list(schedule.rows()) == list(PFC.iter_amortization(4000000, 8.5, 20))
+
+
+def test_amortize_many_matches_schedule():
+    np = pytest.importorskip("numpy")
+    loans = [(4000000.0, 8.5, 20.0), (250000.0, 0.0, 2.0), (1000000.0, 12.0, 5.5)]
+    book = PFC.amortize_many(*map(list, zip(*loans)))
+    for i, (p, r, y) in enumerate(loans):
+        schedule = PFC.amortization_schedule(p, r, y)
+        n = len(schedule)
+        assert book["months"][i] == n
+        assert book["emi"][i] == pytest.approx(schedule.emi)
+        for key, column in (("opening", schedule.opening), ("interest", schedule.interest),
+                            ("principal", schedule.principal), ("closing", schedule.closing)):
+            assert np.allclose(book[key][i, :n], column, rtol=1e-9, atol=1e-4), key
+            assert not book[key][i, n:].any()
+
+
+def reference_loan(principal, annual_rate_pct, years, events):
+    """Month-by-month simulation of simulate_loan's rules; returns (emi, months, interest)."""
+    def payments_left(bal, r, m):
+        k = 0
+        while bal > 1e-7:
+            bal = bal * (1 + r) - m
+            k += 1
+        return k
+
+    r = annual_rate_pct / 1200
+    bal, end = float(principal), int(round(years * 12))
+    m = PFC.emi(principal, annual_rate_pct, years)
+    pending = sorted(events, key=lambda e: e.month)
+    months, interest = 0, 0.0
+    while bal > 1e-7:
+        while pending and pending[0].month == months:
+            ev = pending.pop(0)
+            bal -= min(ev.prepayment, bal)
+            if ev.annual_rate_pct is not None:
+                r = ev.annual_rate_pct / 1200
+            if bal <= 1e-7:
+                break
+            if ev.reduce == "emi":
+                g = (1 + r) ** (end - months)
+                m = bal / (end - months) if r == 0 else bal * r * g / (g - 1)
+            else:
+                end = months + payments_left(bal, r, m)
+        if bal <= 1e-7:
+            break
+        due = bal * r
+        interest += due
+        bal -= min(m, bal + due) - due
+        months += 1
+    return m, months, interest
+
+
+LOAN_SCENARIOS = {
+    "none": [],
+    "prepay-tenure": [PFC.LoanEvent(24, prepayment=500000)],
+    "prepay-emi": [PFC.LoanEvent(24, prepayment=500000, reduce="emi")],
+    "rate-reset": [PFC.LoanEvent(12, annual_rate_pct=9.75, reduce="emi"), PFC.LoanEvent(60, annual_rate_pct=7.5)],
+    "mixed": [PFC.LoanEvent(0, prepayment=100000, reduce="emi"), PFC.LoanEvent(36, prepayment=300000, annual_rate_pct=9.0),
+              PFC.LoanEvent(120, prepayment=200000)],
+    "paid-off": [PFC.LoanEvent(60, prepayment=1e9), PFC.LoanEvent(90, prepayment=100000)],
+}
+
+
+@pytest.mark.parametrize("name", LOAN_SCENARIOS)
+def test_simulate_loan_matches_month_by_month(name):
+    events = LOAN_SCENARIOS[name]
+    sim = PFC.simulate_loan(4000000, 8.5, 20, events)
+    m, months, interest = reference_loan(4000000, 8.5, 20, events)
+    assert sim.emi == pytest.approx(m, rel=1e-9)
+    assert sim.months == months
+    assert sim.total_interest == pytest.approx(interest, rel=1e-9)
+    assert sim.baseline_interest == pytest.approx(PFC.emi(4000000, 8.5, 20) * 240 - 4000000)
+    assert sim.interest_saved == pytest.approx(sum(sim.event_savings), abs=1e-6)
+    if not events:
+        assert (sim.months, sim.interest_saved, sim.event_savings) == (240, 0.0, [])
+
+
+def test_simulate_loan_prepayment_tradeoff_and_errors():
+    tenure, keep_end = PFC.simulate_loans(4000000, 8.5, 20, [LOAN_SCENARIOS["prepay-tenure"], LOAN_SCENARIOS["prepay-emi"]])
+    assert tenure.months < keep_end.months == 240
+    assert tenure.emi == pytest.approx(PFC.emi(4000000, 8.5, 20)) and keep_end.emi < tenure.emi
+    assert tenure.interest_saved > keep_end.interest_saved > 0
+    with pytest.raises(ValueError):
+        PFC.simulate_loan(4000000, 8.5, 20, [PFC.LoanEvent(-1, prepayment=1000)])
+    with pytest.raises(ValueError):
+        PFC.simulate_loan(4000000, 8.5, 20, [PFC.LoanEvent(12, prepayment=1000, reduce="both")])
+    with pytest.raises(ValueError, match="reduce='emi'"):
+        PFC.simulate_loan(4000000, 8.5, 20, [PFC.LoanEvent(12, annual_rate_pct=40.0)])
+
+
+# ------------------- SIP -------------------
+
+def test_sip_many_matches_scalar():
+    np = pytest.importorskip("numpy")
+    monthly = np.array([500.0, 5000.0, 12345.67])
+    rates = np.array([0.0, 7.5, 12.0, 18.0])
+    years = np.array([0.5, 1.0, 10.0, 15.0, 30.0])
+    fv = PFC.future_value_sip_many(monthly[:, None, None], rates[None, :, None], years[None, None, :])
+    req = PFC.required_sip_many(monthly[:, None, None] * 100, rates[None, :, None], years[None, None, :])
+    for i, m in enumerate(monthly.tolist()):
+        for j, r in enumerate(rates.tolist()):
+            for k, y in enumerate(years.tolist()):
+                assert fv[i, j, k] == PFC.future_value_sip(m, r, y)
+                assert req[i, j, k] == PFC.required_sip(m * 100, r, y)
+
+
+def test_required_sip_inverts_future_value_sip():
+    for rate in (0.0, 8.0, 12.0):
+        for years in (1, 15, 30):
+            assert PFC.future_value_sip(PFC.required_sip(5000000, rate, years), rate, years) == pytest.approx(5000000)
+
+
+# ------------------- Cashflows & XIRR -------------------
+
+def test_step_up_sip_closed_form_matches_cashflows():
+    for rate, years, step in ((12.0, 10.5, 10.0), (0.0, 3.0, 5.0), (8.0, 7.0, 0.0), (12.0, 5.0, 12.682503013196977)):
+        cf = PFC.Cashflows().add_sip(10000, years, step_up_pct=step)
+        assert PFC.future_value_step_up_sip(10000, rate, years, step) == pytest.approx(cf.future_value(rate), rel=1e-12)
+
+
+def test_xirr_recovers_known_rates():
+    cf = PFC.Cashflows().add_sip(10000, 10.5, step_up_pct=10)
+    assert cf.xirr(cf.future_value(12.0)) == pytest.approx(1.01 ** 12 - 1, abs=1e-10)
+    assert PFC.xirr([-1000.0, 1100.0], [0.0, 1.0]) == pytest.approx(0.10, abs=1e-12)
+    dates = [date(2020, 1, 1), date(2022, 1, 1)]
+    assert PFC.xirr([-100000, 121000], dates) == pytest.approx(1.21 ** (365 / 731) - 1, abs=1e-10)
+    with pytest.raises(ValueError):
+        PFC.xirr([100.0, 200.0], [0.0, 1.0])
+
+
+def test_xirr_many_matches_xirr():
+    np = pytest.importorskip("numpy")
+    series = [
+        ([-10000.0, 2000.0, 3000.0, 4000.0, 5000.0], [0.0, 1.0, 2.0, 3.0, 4.0]),
+        ([-5000.0, -5000.0, 12000.0, 0.0, 0.0], [0.0, 0.5, 1.5, 0.0, 0.0]),
+        ([-1000.0, 10.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0, 0.0]),
+    ]
+    amounts, times = map(np.array, zip(*series))
+    batch = PFC.xirr_many(amounts, times)
+    for rate, (a, t) in zip(batch.tolist(), series):
+        k = max(i for i, x in enumerate(a) if x) + 1
+        assert rate == pytest.approx(PFC.xirr(a[:k], t[:k]), abs=1e-8)
+    assert math.isnan(PFC.xirr_many([[100.0, 200.0]], [[0.0, 1.0]])[0])
+
+
+def test_xirr_portfolio_matches_cashflows_xirr():
+    pytest.importorskip("numpy")
+    series = [PFC.Cashflows().add_sip(5000, 5), PFC.Cashflows().add_sip(10000, 10.5, step_up_pct=10).add_withdrawal(60, 200000),
+              PFC.Cashflows().add_lumpsum(0, 100000)]
+    finals = [450000.0, 3000000.0, 180000.0]
+    batch = PFC.xirr_portfolio(series, finals)
+    for rate, cf, final in zip(batch.tolist(), series, finals):
+        assert rate == pytest.approx(cf.xirr(final), abs=1e-8)
+
+
+# ------------------- Formatting -------------------
+
+def reference_currency(n: float) -> str:
+    """The original split/regroup formatter that currency() replaced."""
+    neg = n < 0
+    s = f"{abs(n):,.2f}"
+    whole, frac = s.split('.')
+    whole = whole.replace(',', '')
+    if len(whole) > 3:
+        head, tail = whole[:-3], whole[-3:]
+        groups = []
+        while head:
+            groups.insert(0, head[-2:])
+            head = head[:-2]
+        whole = ','.join(groups + [tail])
+    return ("-₹" if neg else "₹") + whole + '.' + frac
+
+
+def sample_amounts(n=5000, seed=7):
+    rng = random.Random(seed)
+    edges = [0.0, 0.004, 0.005, 0.994, 0.995, 0.999, 999.995, 1000.0, 99999.995, 1e5, 1e7 - 0.005, 1e7, 1e12, 1e15]
+    values = edges + [rng.uniform(0, 10 ** rng.randint(0, 13)) for _ in range(n)]
+    return values + [-v for v in values]
+
+
+def test_currency_matches_original_formatter():
+    assert PFC.currency(12345678.9) == "₹1,23,45,678.90"
+    assert PFC.currency(-999.995) == "-₹1,000.00"
+    for n in sample_amounts():
+        assert PFC.currency(n) == reference_currency(n), n
+
+
+def test_currency_many_matches_currency():
+    values = sample_amounts(1000)
+    expected = [PFC.currency(v) for v in values]
+    assert PFC.currency_many(values) == expected
+    assert PFC.currency_many(values, cache=True) == expected
+
+
+def test_currency_rejects_non_finite():
+    for n in (math.inf, -math.inf, math.nan):
+        with pytest.raises(ValueError):
+            PFC.currency(n)
+
+
+@pytest.mark.parametrize("rounding", ["half_even", "half_up", "down", "up"])
+def test_currency_compact_many_matches_scalar(rounding):
+    pytest.importorskip("numpy")
+    values = sample_amounts(1000)
+    expected = [PFC.currency_compact(v, 2, rounding) for v in values]
+    assert PFC.currency_compact_many(values, 2, rounding) == expected
+
+
+def test_currency_compact_groups_like_currency():
+    for crores in (1000, 12345, 100000, 98765432):
+        grouped = PFC.currency(crores)[:-len(".00")]
+        assert PFC.currency_compact(crores * 1e7) == grouped + " Cr"
+        assert PFC.currency_compact(-crores * 1e7) == "-" + grouped + " Cr"
+    with pytest.raises(ValueError, match="half_even"):
+        PFC.currency_compact(1e5, rounding="nearest")
+    with pytest.raises(ValueError, match="half_even"):
+        PFC.currency_compact_many([1e5], rounding="nearest")
+
+
+def test_currency_compact_known_values():
+    assert PFC.currency_compact(150000) == "₹1.5 L"
+    assert PFC.currency_compact(12345678) == "₹1.23 Cr"
+    assert PFC.currency_compact(99999) == "₹1 L"  # rounds up into the next unit
+    assert PFC.currency_compact(99999, 1, "down") == "₹99.9 K"
+    assert PFC.currency_compact(999.5) == "₹999.5"
+
+
+# ------------------- Profile persistence -------------------
+
+def test_write_atomic_replaces_or_leaves_the_file(tmp_path):
+    path = tmp_path / "profile.json"
+    PFC.write_atomic(str(path), "first")
+    PFC.write_atomic(str(path), b"second")
+    assert path.read_text() == "second"
+    with pytest.raises(TypeError):
+        PFC.write_atomic(str(path), 123)  # fails mid-write
+    assert path.read_text() == "second"
+    assert sorted(p.name for p in tmp_path.iterdir() if not p.name.endswith(".lock")) == ["profile.json"]
+
+
+def test_profile_file_skips_unchanged_saves(tmp_path):
+    pf = PFC.ProfileFile(str(tmp_path / "profile.json"))
+    profile = pf.load()
+    assert pf.save(profile) is True          # nothing on disk yet
+    assert pf.save(profile) is False
+    assert pf.save(profile, force=True) is True
+    profile.monthly_income = 150000.0
+    assert pf.is_dirty(profile) and pf.save(profile) is True
+    again = PFC.ProfileFile(pf.path)
+    assert again.load() == profile and not again.is_dirty(profile)
+
+
+def test_profile_file_never_overwrites_an_unreadable_file(tmp_path):
+    path = tmp_path / "profile.json"
+    path.write_text('{"name": "Asha", "age": ')
+    pf = PFC.ProfileFile(str(path))
+    assert pf.load().name == "Friend"  # falls back to a fresh profile
+    with pytest.raises(ValueError, match="not overwriting"):
+        pf.save(PFC.UserProfile(name="Asha"), force=True)
+    assert path.read_text() == '{"name": "Asha", "age": '
+
+
+# ------------------- Multi-user profile stores -------------------
+
+def test_profile_file_keeps_other_users_in_a_multi_user_file(tmp_path):
+    path = str(tmp_path / "profile.json")
+    store = PFC.JsonProfileStore(path)
+    store.put_many([(PFC.DEFAULT_USER_ID, PFC.UserProfile(name="Me")), ("asha", PFC.UserProfile(name="Asha", age=34))])
+    pf = PFC.ProfileFile(path)
+    me = pf.load()
+    assert me.name == "Me"
+    me.monthly_income = 200000.0
+    assert pf.save(me)
+    assert store.user_ids() == [PFC.DEFAULT_USER_ID, "asha"]
+    assert (store.get("asha").name, store.get("asha").age) == ("Asha", 34)
+    assert store.get(PFC.DEFAULT_USER_ID) == me
+    assert PFC.ProfileFile(path).load() == me
+    compact = PFC.ProfileFile(path, PFC.ProfileSerializer(compact=True))
+    compact.load()
+    assert compact.save(me, force=True) and "\n" not in open(path).read()  # written by its serializer
+    assert store.get("asha").age == 34
+    assert store.delete("asha") and not store.delete("asha")
+    assert PFC.ProfileFile(path).load() == me  # back to a single-profile file
+
+
+def test_sqlite_store_round_trip(tmp_path):
+    with PFC.SQLiteProfileStore(str(tmp_path / "profiles.db")) as store:
+        profiles = {f"u{i}": PFC.UserProfile(name=f"User {i}", age=20 + i, monthly_income=1000.0 * i, city=None)
+                    for i in range(1200)}  # more ids than one IN (...) query takes
+        assert store.put_many(profiles.items()) == 1200
+        assert store.get_many(list(profiles) + ["missing"]) == profiles
+        assert store.get("missing") is None
+        store.put("u1", PFC.UserProfile(name="Renamed"))
+        assert store.get("u1").name == "Renamed"
+        assert store.delete("u2") and not store.delete("u2")
+        assert sorted(store.user_ids()) == sorted(set(profiles) - {"u2"})
+
+
+def test_profile_store_backends_must_implement_the_bulk_calls():
+    class Partial(PFC.ProfileStore):
+        def get_many(self, user_ids):
+            return {}
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+# ------------------- Serialization -------------------
+
+def serializers():
+    for backend in PFC.ProfileSerializer.BACKENDS:
+        try:
+            yield PFC.ProfileSerializer(backend)
+        except ImportError:
+            pass
+
+
+@pytest.mark.parametrize("ser", list(serializers()), ids=lambda s: s.backend)
+def test_serializer_round_trips_profiles(ser, tmp_path):
+    profiles = [PFC.UserProfile(), PFC.UserProfile(name="Ravi ₹", age=41, monthly_income=1.5e5, monthly_expenses=60000.0,
+                                                   city="Pune", regime_preference="old")]
+    for profile in profiles:
+        assert ser.loads(ser.dumps(profile)) == profile
+        assert PFC.ProfileSerializer(ser.backend, compact=False).loads(ser.dumps(profile)) == profile
+    path = str(tmp_path / "profiles.ndjson")
+    assert ser.dump_ndjson(profiles * 3, path) == 6
+    assert list(ser.iter_ndjson(path)) == profiles * 3
+
+
+@pytest.mark.parametrize("data, message", [
+    ({"name": "A", "salary": 1}, "unknown profile fields: salary"),
+    ({"age": "forty"}, "'age' must be int"),
+    ({"age": True}, "'age' must be int"),
+    ({"monthly_income": "1L"}, "'monthly_income' must be float"),
+    ({"name": None}, "'name' may not be null"),
+    ([], "JSON object"),
+])
+def test_profile_from_dict_rejects_bad_fields(data, message):
+    with pytest.raises(ValueError, match=message):
+        PFC.profile_from_dict(data)
+
+
+def test_profile_from_dict_accepts_nulls_and_int_floats():
+    profile = PFC.profile_from_dict({"age": None, "monthly_income": 100000})
+    assert profile.age is None and profile.monthly_income == 100000.0
+    assert type(profile.monthly_income) is float
+
+
+# ------------------- Headless engine -------------------
+
+def test_tax_response_format():
+    res = PFC.PlannerEngine().tax(PFC.TaxRequest(1800000, True, "old", 150000, 25000))
+    assert "\n".join(res.lines) == "\n".join([
+        "\n— Tax Estimate —",
+        "Regime: Old",
+        "Gross Income:      ₹18,00,000.00",
+        "Std Deduction:     ₹50,000.00",
+        "Other Deductions:  ₹1,75,000.00",
+        "Taxable Income:    ₹15,75,000.00",
+        "Base Tax:          ₹2,85,000.00",
+        "Cess (4%):         ₹11,400.00",
+        "Total Tax:         ₹2,96,400.00",
+        "Effective Rate:    16.47%\n",
+    ])
+
+
+def test_engine_builds_requests_from_dicts():
+    engine = PFC.PlannerEngine()
+    res = engine.handle_dict("emi", {"principal": "4000000", "rate": 8.5, "years": 20})
+    assert res.ok and res.data["emi"] == pytest.approx(PFC.emi(4000000, 8.5, 20))
+    assert engine.handle_dict("tax", {"income": 1800000, "salaried": "no"}).data["std_deduction"] == 0.0
+    assert not engine.handle(PFC.RetirementRequest(age=40, retire_age=40, monthly_expense=50000)).ok
+    for command, payload, message in (("budget", {}, "unknown command"),
+                                      ("emi", {"principal": 1, "rate": 1, "years": 1, "tenure": 1}, "unknown fields"),
+                                      ("emi", {"principal": 1}, "rate"),
+                                      ("emi", {"principal": "ten", "rate": 1, "years": 1}, "ten")):
+        with pytest.raises(ValueError, match=message):
+            PFC.request_from_dict(command, payload)
+
+
+def test_engine_profile_update_returns_a_new_profile():
+    before = PFC.UserProfile(name="Asha", monthly_income=100000.0)
+    res = PFC.PlannerEngine().profile(PFC.ProfileRequest(before, {"name": " ", "age": "34", "risk": "Aggressive"}))
+    after = res.data["profile"]
+    assert (after.name, after.age, after.risk, after.monthly_income) == ("Asha", 34, "aggressive", 100000.0)
+    assert before.age is None
+
+
+# ------------------- HTTP service -------------------
+
+class RecordingWriter:
+    def __init__(self):
+        self.buf = b""
+        self.closed = False
+
+    def write(self, data):
+        self.buf += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def serve_bytes(raw: bytes, **kwargs) -> list:
+    """Feed raw request bytes through one connection; returns [(status, body)] in order."""
+    svc = PFC.PlannerService(PFC.PlannerEngine(), **kwargs)
+
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        writer = RecordingWriter()
+        await svc._serve_connection(reader, writer)
+        assert writer.closed
+        return writer.buf
+
+    out, replies = asyncio.run(run()), []
+    while out:
+        head, _, rest = out.partition(b"\r\n\r\n")
+        length = int(next(h for h in head.split(b"\r\n") if h.lower().startswith(b"content-length")).split(b":")[1])
+        replies.append((int(head.split(b" ")[1]), json.loads(rest[:length])))
+        out = rest[length:]
+    return replies
+
+
+def post(path: str, body: bytes, extra: bytes = b"") -> bytes:
+    return b"POST " + path.encode() + b" HTTP/1.1\r\nContent-Length: " + str(len(body)).encode() + b"\r\n" + extra + b"\r\n" + body
+
+
+def test_service_answers_pipelined_requests_in_order():
+    replies = serve_bytes(post("/emi", b'{"principal": 4000000, "rate": 8.5, "years": 20}')
+                          + post("/tax", b'{"income": "ten"}') + b"GET /health HTTP/1.1\r\n\r\n"
+                          + post("/nope", b"{}", b"Connection: close\r\n") + post("/emi", b"{}"))
+    assert [status for status, _ in replies] == [200, 400, 200, 404]  # nothing read after Connection: close
+    assert replies[0][1]["data"]["emi"] == pytest.approx(PFC.emi(4000000, 8.5, 20))
+
+
+@pytest.mark.parametrize("length", [b"abc", b"-5", b"1e3"])
+def test_service_rejects_a_malformed_content_length(length):
+    raw = b"POST /emi HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n{}"
+    assert serve_bytes(raw) == [(400, {"error": "invalid Content-Length"})]
+
+
+def test_service_rejects_an_oversized_body():
+    assert serve_bytes(post("/emi", b"{}" * 10), max_body=8) == [(413, {"error": "body too large"})]
+
+
+def test_batch_tax_parses_salaried_like_tax():
+    payload = {"income": [1800000.0, 1800000.0, 1800000.0], "salaried": ["no", "yes", "false"], "regime": "new"}
+    out = PFC._batch_tax(payload)
+    assert out["std_deduction"] == [0.0, 50000.0, 0.0]
+    engine = PFC.PlannerEngine()
+    for i, flag in enumerate(payload["salaried"]):
+        assert out["total_tax"][i] == engine.handle_dict("tax", {"income": 1800000, "salaried": flag}).data["total_tax"]
+    assert PFC._batch_tax({**payload, "salaried": "no"})["std_deduction"] == [0.0] * 3
+
+
+# ------------------- Batch tax CLI -------------------
+
+def test_tax_batch_csv(tmp_path):
+    src, out = tmp_path / "in.csv", tmp_path / "out.csv"
+    src.write_text("id,income\n1,600000\n2,1800000\n", encoding="utf-8")
+    assert PFC.tax_batch(str(src), str(out), chunk_size=1) == 2
+    rows = out.read_text(encoding="utf-8").splitlines()
+    assert rows[0].startswith("id,income,regime,std_deduction,")
+    assert rows[2].split(",")[:3] == ["2", "1800000", "new"]
+    src.write_text("id,salary\n1,600000\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="'income' column"):
+        PFC.tax_batch(str(src), str(out))
+
+
+def test_tax_batch_csv_pads_ragged_rows_and_skips_blank_ones(tmp_path):
+    src, out = tmp_path / "in.csv", tmp_path / "out.csv"
+    src.write_text("\nid,income,regime,d80c\n1,1800000,old,150000\n\n2,1800000\n,,,\n3,1800000,old\n", encoding="utf-8")
+    assert PFC.tax_batch(str(src), str(out), chunk_size=2) == 3
+    with open(out, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert [(r["id"], r["regime"], r["d80c"]) for r in rows] == [("1", "old", "150000"), ("2", "", ""), ("3", "old", "")]
+    calc = PFC.IndiaTaxCalculator()
+    expected = [calc.estimate(1800000, True, "old", 150000), calc.estimate(1800000), calc.estimate(1800000, True, "old")]
+    assert [float(r["total_tax"]) for r in rows] == [e["total_tax"] for e in expected]
+    src.write_text("id,income\n1,600000,extra\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="line 2: 3 fields but the header has 2"):
+        PFC.tax_batch(str(src), str(out))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 10])
+def test_tax_batch_rejects_a_blank_income_by_row(tmp_path, chunk_size):
+    src, out = tmp_path / "in.csv", tmp_path / "out.csv"
+    src.write_text("id,income\n1,600000\n2,700000\n3,\n4,900000\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="row 3: income is blank"):
+        PFC.tax_batch(str(src), str(out), chunk_size=chunk_size)
+    src.write_text("id,income\n1,600000\n2,12L\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="row 2: income '12L' is not a number"):
+        PFC.tax_batch(str(src), str(out), chunk_size=chunk_size)
+
+
+def test_chunk_writer_keeps_the_first_chunks_column_order(tmp_path):
+    out = tmp_path / "out.csv"
+    writer = PFC._ChunkWriter(str(out))
+    writer.write({"a": [1], "b": [2]})
+    writer.write({"b": [4], "a": [3]})
+    with pytest.raises(ValueError, match="differ from the first chunk"):
+        writer.write({"a": [5], "c": [6]})
+    writer.close()
+    assert out.read_text(encoding="utf-8").splitlines() == ["a,b", "1,2", "3,4"]
+
+
+# ------------------- Chat sessions -------------------
+
+class CountingStore(PFC.JsonProfileStore):
+    def __init__(self, path):
+        super().__init__(path)
+        self.writes = 0
+
+    def put_many(self, items):
+        self.writes += 1
+        return super().put_many(items)
+
+
+def test_sessions_save_changed_profiles_once_on_drop(tmp_path):
+    store = CountingStore(str(tmp_path / "profiles.json"))
+    sessions = PFC.SessionManager(store=store)
+    sessions.feed("asha", "profile")
+    for answer in ("Asha", "34", "", "", "", "", "", ""):
+        out = sessions.feed("asha", answer)
+    assert "\nSaved ✔\n" in out and store.writes == 1
+    sessions.feed("asha", "quit")  # quit saves, then the drop finds nothing new
+    assert "asha" not in sessions and store.writes == 1
+    assert store.get("asha").age == 34
+
+    sessions.session("asha").profile.city = "Pune"  # reopened from the store, then edited
+    sessions.feed("guest", "help")                  # a new session that never touches its profile
+    sessions.feed("guest", "sip")                   # ... and is dropped mid-flow
+    assert sessions.evict_idle(now=time.monotonic() + sessions.idle_timeout + 1) == 2
+    assert len(sessions) == 0 and store.writes == 2
+    assert store.user_ids() == ["asha"] and store.get("asha").city == "Pune"
+
+
+# ------------------- Freeform chat -------------------
+
+@pytest.mark.parametrize("text, command, slots", [
+    ("tax for 18 lakh new regime", "tax", dict(amounts=(1800000.0,), regime="new")),
+    ("need ₹50L in 15 yrs at 12% – how much SIP?", "sip",
+     dict(amounts=(5000000.0,), percents=(12.0,), years=15.0, wants_target=True)),
+    ("tax for 12 lakh old regime", "tax", dict(amounts=(1200000.0,), regime="old")),
+    ("tax on 15L, not salaried, old regime, 80c 1.5 lakh, 80d 25k", "tax",
+     dict(amounts=(1500000.0,), regime="old", salaried=False, d80c=150000.0, d80d=25000.0)),
+])
+def test_extract_slots_parses_the_help_examples(text, command, slots):
+    assert PFC.freeform_command(text) == command
+    assert PFC.extract_slots(text) == PFC.Slots(**slots)
+
+
+def test_freeform_tax_answers_in_one_round_trip():
+    sessions = PFC.SessionManager()
+    out = sessions.feed("u", "tax for 18 lakh new regime")
+    expected = PFC.PlannerEngine().tax(PFC.TaxRequest(1800000, True, "new")).lines
+    assert out == expected and not sessions.waiting("u")
+    out = sessions.feed("u", "need ₹50L in 15 yrs at 12% – how much SIP?")
+    assert out == [f"Required monthly SIP ≈ {PFC.currency(PFC.required_sip(5000000, 12, 15))}"]
+
+
+def test_freeform_old_regime_tax_still_asks_for_deductions():
+    sessions = PFC.SessionManager()
+    assert sessions.feed("u", "tax for 12 lakh old regime") == ["80C deductions ₹ (max 1.5L): "]
+    assert sessions.feed("u", "150000") == ["80D health insurance ₹ (max 25k): "]
+    out = sessions.feed("u", "25000")
+    assert out == PFC.PlannerEngine().tax(PFC.TaxRequest(1200000, True, "old", 150000, 25000)).lines
+    assert sessions.feed("u", "tax for 12 lakh")[-1] == "Are you salaried? (y/n) [y]: "  # no regime: ask
+
+
+# The REPL's help screen, byte for byte as the original hand-written HELP_TEXT
+ORIGINAL_HELP = """What I can do:
+ 1) tax           -> Estimate income tax (India, Old vs New)
+ 2) sip           -> SIP calculator (future value or required monthly)
+ 3) goal          -> Plan a goal (target amount, return, years)
+ 4) retirement    -> Retirement corpus estimate
+ 5) emergency     -> Emergency fund target
+ 6) emi           -> Loan EMI calculator
+ 7) allocate      -> Suggested asset allocation
+ 8) profile       -> View or update your profile
+ 9) help          -> Show this help
+10) quit/exit     -> Save & exit
+
+Tip: You can also just type things like "tax for 18 lakh new regime" or
+"need ₹50L in 15 yrs at 12% – how much SIP?" and I'll try to parse it."""
+
+
+def test_help_text_is_unchanged():
+    assert PFC.HELP_TEXT == ORIGINAL_HELP
+
+
+def test_router_keywords_come_from_the_registry():
+    for cmd in PFC.COMMANDS:
+        for word in (cmd.name,) + cmd.aliases + cmd.keywords:
+            expected = cmd.name if cmd.priority is not None and any(c.isalnum() for c in word) else None
+            assert PFC.freeform_command(f"something about {word} please") == expected, word
+    assert PFC.freeform_command("loan of 2 cr at 8.5% for 20 years") == "emi"
+    assert PFC.freeform_command("tax on my home loan") == "tax"
+    assert PFC.freeform_command("what is a premium?") is None
+
+
+def test_freeform_loan_answers_in_one_round_trip():
+    out = PFC.SessionManager().feed("u", "loan of 2 cr at 8.5% for 20 years")
+    assert out == PFC.PlannerEngine().emi(PFC.EmiRequest(2e7, 8.5, 20)).lines
+
+
+def test_custom_registries_route_only_their_own_commands():
+    registry = PFC.CommandRegistry()
+
+    @registry.command("budget", help="Monthly budget", keywords=("spend",), priority=0)
+    def flow_budget(ctx, slots=PFC.NO_SLOTS):
+        yield PFC.SAY, f"budget {slots.amount}"
+
+    @registry.command("bye", help="Exit", exits=True)
+    def flow_bye(ctx, slots=PFC.NO_SLOTS):
+        yield PFC.SAY, "bye"
+
+    sessions = PFC.SessionManager(commands=registry)
+    assert sessions.feed("u", "can I spend 5k?") == ["budget 5000.0"]
+    assert sessions.feed("u", "tax for 18 lakh") == ["I didn't catch that. Type 'help' for options."]
+    assert sessions.feed("u", "I want to say bye") == ["I didn't catch that. Type 'help' for options."]
+    assert registry.route("budget") is registry.get("budget")